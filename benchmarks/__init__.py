@@ -0,0 +1 @@
+# benchmarks: đo throughput mô phỏng và chi phí optimizer (chạy: python -m benchmarks)
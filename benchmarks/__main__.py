@@ -0,0 +1,83 @@
+# benchmarks/__main__.py
+# python -m benchmarks --backend fake --suites sim,controller,pbil,generation
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import platform
+import subprocess
+from datetime import datetime
+
+from choose_atsc_pbil.utils.logger import setup_multiprocess_logging
+
+from . import bench_controller, bench_generation, bench_pbil, bench_sim
+from .common import load_json
+
+SUITES = {
+    "sim": bench_sim,
+    "controller": bench_controller,
+    "pbil": bench_pbil,
+    "generation": bench_generation,
+}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark suite (kết quả JSON để so sánh giữa các commit)")
+    ap.add_argument("--config", default="configs/config.json")
+    ap.add_argument("--backend", default="fake", choices=["fake", "libsumo", "traci"],
+                    help="fake: backend giả lập, không cần SUMO")
+    ap.add_argument("--suites", default=",".join(SUITES))
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--max-processes", type=int, default=None)
+    ap.add_argument("--output", default=None)
+    args = ap.parse_args()
+
+    commit = _git_commit()
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    output = args.output or os.path.join("benchmarks", "results", f"{timestamp}_{commit}_{args.backend}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+
+    log_queue, listener = setup_multiprocess_logging(os.path.join(os.path.dirname(output) or ".", "logs"))
+    logger = logging.getLogger(__name__)
+    try:
+        cfg = load_json(args.config)
+        results = []
+        for name in args.suites.split(","):
+            logger.info("__________ Benchmark: %s __________", name)
+            if name == "generation":
+                suite_results = bench_generation.run(cfg, args.backend, args.repeat,
+                                                     log_queue=log_queue, max_procs=args.max_processes)
+            else:
+                suite_results = SUITES[name].run(cfg, args.backend, args.repeat)
+            for r in suite_results:
+                logger.info("%s/%s %s -> %.4f %s", r["suite"], r["name"], r["params"], r["value"], r["unit"])
+            results.extend(suite_results)
+
+        report = {
+            "commit": commit,
+            "timestamp": timestamp,
+            "backend": args.backend,
+            "python": platform.python_version(),
+            "cpu_count": mp.cpu_count(),
+            "repeat": args.repeat,
+            "results": results,
+        }
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info("Benchmark results saved to: %s", output)
+    finally:
+        listener.stop()
+        logging.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# benchmarks/bench_controller.py
+# Độ trễ quyết định của MaxPressure (lấy mẫu occupancy và tính split mỗi chu kỳ)
+import time
+
+from choose_atsc_pbil.controllers import build as build_controller
+from choose_atsc_pbil.sim.traci_interface import TraciIF
+
+from .common import measure, result, scenario_config, scenario_net_info
+
+N_CYCLES = 50
+
+
+def run(base_cfg: dict, backend: str, repeat: int) -> list:
+    cfg = scenario_config(base_cfg, "phuquoc", backend)
+    net_info = scenario_net_info(cfg)
+    spec = cfg["controllers"]["max_pressure"]
+
+    iface = TraciIF(cfg["sumo"])
+    iface.start()
+    try:
+        iface.subscribe_detectors()
+        controllers = []
+        for tls_id, tls_info in net_info["tls"].items():
+            params = dict(spec.get("params", {}), tls_info=tls_info)
+            ctrl = build_controller(spec["name"], tls_id, iface, **params)
+            ctrl.start()
+            controllers.append(ctrl)
+
+        clock = time.perf_counter
+        sample_times, decide_times = [], []
+
+        def once():
+            sample = decide = 0.0
+            for k in range(N_CYCLES):
+                t = float(k + 1)
+                for ctrl in controllers:
+                    t0 = clock()
+                    ctrl._sample_action(t)
+                    t1 = clock()
+                    ctrl._decide_action()
+                    sample += t1 - t0
+                    decide += clock() - t1
+            n = N_CYCLES * max(len(controllers), 1)
+            sample_times.append(sample / n * 1e6)
+            decide_times.append(decide / n * 1e6)
+
+        measure(once, repeat)
+    finally:
+        iface.shutdown()
+
+    params = {"scenario": "phuquoc", "n_tls": len(controllers)}
+    return [
+        result("controller", "max_pressure_sample", params, sample_times, "us/call"),
+        result("controller", "max_pressure_decide", params, decide_times, "us/call"),
+    ]
@@ -0,0 +1,50 @@
+# benchmarks/bench_generation.py
+# Thời gian một thế hệ PBIL (Pool + runner + đánh giá quần thể) theo số process
+import multiprocessing as mp
+import time
+
+from choose_atsc_pbil.cli import run_pbil
+from choose_atsc_pbil.core.backends import LocalBackend
+from choose_atsc_pbil.core.pbil import PBIL, PBILConfig
+from choose_atsc_pbil.sim.sim_runner import SumoSimRunner
+
+from .common import result, scenario_candidates, scenario_config, scenario_net_info
+
+
+def _process_counts(max_procs: int) -> list:
+    counts, n = [], 1
+    while n < max_procs:
+        counts.append(n)
+        n *= 2
+    return counts + [max_procs]
+
+
+def run(base_cfg: dict, backend: str, repeat: int, log_queue=None, max_procs=None) -> list:
+    cfg = scenario_config(base_cfg, "phuquoc", backend)
+    net_info = scenario_net_info(cfg)
+    candidates = scenario_candidates(cfg)
+    pbil = PBIL(PBILConfig(**cfg["pbil"]), {tls_id: 0.5 for tls_id in candidates}, net_info)
+    runner = SumoSimRunner(cfg["sumo"], cfg["controllers"], cfg["pbil"], net_info)
+    pop = [tuple(x.tolist()) for x in pbil.sample_population()]
+
+    results = []
+    max_procs = max_procs or cfg.get("system", {}).get("max_processes") or mp.cpu_count()
+    for procs in _process_counts(max_procs):
+        incumbent = mp.Value("d", float("inf"))
+        t0 = time.perf_counter()
+        backend = LocalBackend(run_pbil._run_simulation, procs, run_pbil._pool_worker_init,
+                               (log_queue, runner, incumbent, pbil, candidates))
+        startup = time.perf_counter() - t0
+
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            run_pbil._evaluate(backend, pop, incumbent)
+            samples.append(time.perf_counter() - t0)
+        backend.close()
+
+        results.append(result("generation", "generation_time",
+                               {"scenario": "phuquoc", "processes": procs, "population": len(pop),
+                                "pool_startup_s": round(startup, 4)},
+                               samples, "s"))
+    return results
@@ -0,0 +1,25 @@
+# benchmarks/bench_pbil.py
+# Chi phí của optimizer: PBIL.sample_population / update theo số candidate C
+import numpy as np
+
+from choose_atsc_pbil.core.pbil import PBIL, PBILConfig
+
+from .common import measure, result
+
+SIZES = [10, 100, 1000, 10000]
+
+
+def run(base_cfg: dict, backend: str, repeat: int) -> list:
+    results = []
+    params = {k: v for k, v in base_cfg["pbil"].items() if k in PBILConfig.__dataclass_fields__}
+    for C in SIZES:
+        pbil = PBIL(PBILConfig(**params), {f"tls{i}": 0.5 for i in range(C)})
+        pop = pbil.sample_population()
+        best, worst = np.array(pop[0]), np.array(pop[-1])
+
+        info = {"C": C, "population": pbil.cfg.population, "N_max": pbil.cfg.N_max}
+        samples = measure(pbil.sample_population, repeat)
+        results.append(result("pbil", "sample_population", info, [s * 1e3 for s in samples], "ms"))
+        samples = measure(lambda: pbil.update(best, worst), repeat)
+        results.append(result("pbil", "update", info, [s * 1e3 for s in samples], "ms"))
+    return results
@@ -0,0 +1,25 @@
+# benchmarks/bench_sim.py
+# Tốc độ mô phỏng của SumoSimRunner.run: giây mô phỏng / giây thực
+from choose_atsc_pbil.sim.sim_runner import SumoSimRunner
+
+from .common import SCENARIOS, result, scenario_candidates, scenario_config, scenario_net_info
+
+
+def run(base_cfg: dict, backend: str, repeat: int) -> list:
+    results = []
+    for scenario in SCENARIOS:
+        cfg = scenario_config(base_cfg, scenario, backend)
+        net_info = scenario_net_info(cfg)
+        runner = SumoSimRunner(cfg["sumo"], cfg["controllers"], cfg["pbil"], net_info)
+        horizon = runner.iface.end_time() - runner.iface.begin_time()
+
+        for label, mask in (("all_fixed", {}),
+                            ("all_atsc", {tls_id: True for tls_id in scenario_candidates(cfg)})):
+            # Lần đầu mở session SUMO, không tính
+            runner.run(mask)
+            # Thời gian theo timings của runner (không gồm pickle/IPC)
+            samples = [runner.run(mask)["timings"]["total"] for _ in range(repeat)]
+            results.append(result("sim", "sim_speed", {"scenario": scenario, "mask": label},
+                                   [horizon / s for s in samples], "sim_s/wall_s"))
+        runner.iface.shutdown()
+    return results
@@ -0,0 +1,64 @@
+# benchmarks/common.py
+import json
+import time
+from statistics import median
+from typing import Callable, List, Optional
+
+# Kịch bản có sẵn trong repo: tên -> (sumocfg, net_info_file, candidates_file)
+SCENARIOS = {
+    "test": ("data/input/sumo/test.sumocfg", None, None),
+    "phuquoc": ("data/input/sumo/PhuQuoc_v2/phuquoc.sumocfg",
+                "data/input/sumo/PhuQuoc_v2/net-info.json",
+                "data/input/sumo/PhuQuoc_v2/tls-candidates.json"),
+}
+
+
+def load_json(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def scenario_config(base_cfg: dict, scenario: str, backend: str) -> dict:
+    """Bản sao config với sumo.* trỏ tới kịch bản và backend đã chọn."""
+    sumocfg, net_info_file, candidates_file = SCENARIOS[scenario]
+    cfg = json.loads(json.dumps(base_cfg))
+    sumo = cfg["sumo"]
+    sumo.update(runner=backend, sumocfg=sumocfg, net_info_file=net_info_file,
+                candidates_file=candidates_file, gui=False, warmup=0)
+    # Kịch bản test không có net_info/detector riêng
+    if net_info_file is None:
+        for key in ("net_file", "rou_file", "detectors_file"):
+            sumo.pop(key, None)
+    return cfg
+
+
+def scenario_net_info(cfg: dict) -> dict:
+    path = cfg["sumo"].get("net_info_file")
+    return load_json(path) if path else {"tls": {}}
+
+
+def scenario_candidates(cfg: dict) -> List[str]:
+    path = cfg["sumo"].get("candidates_file")
+    return load_json(path)["candidate_tls_ids"] if path else []
+
+
+def measure(fn: Callable[[], object], repeat: int) -> List[float]:
+    """Thời gian (giây) của repeat lần gọi fn."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def result(suite: str, name: str, params: dict, samples: List[float], unit: str, value: Optional[float] = None) -> dict:
+    """Một bản ghi kết quả (value mặc định là median của samples)."""
+    return {
+        "suite": suite,
+        "name": name,
+        "params": params,
+        "value": median(samples) if value is None else value,
+        "unit": unit,
+        "samples": samples,
+    }
@@ -1,40 +1,20 @@
-import json
-import glob
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 
-# Đọc tất cả các file scores_gen_*.json trong thư mục
-file_list = sorted(glob.glob("scores_gen_*.json"))
+from choose_atsc_pbil.core.result_log import load_columns
 
-gen_ids = []
-mean_scores = []
+# Thư mục pbil của một lần chạy (chứa individuals.jsonl)
+run_dir = sys.argv[1] if len(sys.argv) > 1 else "../data/results/runs/pbil_run/pbil"
+cols = load_columns(run_dir)
 
-for filename in file_list:
-    gen_id = int(filename.split("_")[-1].split(".")[0])
-    gen_ids.append(gen_id)
-    
-    # Đọc dữ liệu
-    with open(filename, "r") as f:
-        data = json.load(f)
-    
-    # Xử lý tùy theo cấu trúc dữ liệu trong file
-    scores = []
-    for item in data:
-        if isinstance(item, dict):  
-            # trường hợp {"arr": [...], "score": xxx}
-            scores.append(item["score"])
-        elif isinstance(item, list) and len(item) == 2:
-            # trường hợp [ [...], score ]
-            scores.append(item[1])
-        else:
-            # fallback: nếu chỉ là số
-            scores.append(item)
-    
-    mean_scores.append(np.mean(scores))
+# Trung bình score theo từng thế hệ (bỏ cá thể chỉ có score sàng lọc)
+gen_ids = np.unique(cols["gen"])
+mean_scores = [np.nanmean(cols["score"][cols["gen"] == g]) for g in gen_ids]
 
 # Vẽ biểu đồ
 plt.figure(figsize=(8,6))
-plt.plot(gen_ids, mean_scores, marker="o", linestyle="-")
+plt.plot(gen_ids + 1, mean_scores, marker="o", linestyle="-")
 
 plt.xlabel("Gen", fontsize=12)
 plt.ylabel("Trung bình Score", fontsize=12)
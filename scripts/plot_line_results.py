@@ -1,14 +1,15 @@
-import json
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 
-# Đọc dữ liệu từ file JSON
-with open("../data/results/runs/pbil_run/scores_history.json", "r") as f:
-    data = json.load(f)
+from choose_atsc_pbil.core.result_log import load_columns
+
+# Đọc dữ liệu từ log kết quả của lần chạy
+run_dir = sys.argv[1] if len(sys.argv) > 1 else "../data/results/runs/pbil_run/pbil"
+cols = load_columns(run_dir)
 
 # Tạo DataFrame
-rows = [{"sum": sum(arr), "score": score} for arr, score in data]
-df = pd.DataFrame(rows)
+df = pd.DataFrame({"sum": cols["n_on"], "score": cols["score"]}).dropna()
 
 # Lấy min(score) cho mỗi sum
 df_min = df.groupby("sum", as_index=False)["score"].min()
@@ -1,13 +1,15 @@
-import json
+import sys
 import matplotlib.pyplot as plt
 
-# Đọc dữ liệu từ file JSON
-with open("../data/results/runs/pbil_run/scores_history.json", "r") as f:
-    data = json.load(f)
+from choose_atsc_pbil.core.result_log import load_columns
+
+# Đọc dữ liệu từ log kết quả của lần chạy
+run_dir = sys.argv[1] if len(sys.argv) > 1 else "../data/results/runs/pbil_run/pbil"
+cols = load_columns(run_dir)
 
 # Chuyển dữ liệu sang dạng sum và score
-sums = [sum(arr) for arr, score in data]
-scores = [score for arr, score in data]
+sums = cols["n_on"]
+scores = cols["score"]
 
 # Vẽ scatter plot
 plt.figure(figsize=(8,6))
@@ -0,0 +1,237 @@
+# choose_atsc_pbil/cli/batch_eval.py
+# Đánh giá hàng loạt: ma trận kịch bản × mask × seed, chạy song song trên mọi core,
+# ghi một bảng kết quả chung (results.csv) + bảng tổng hợp theo seed (summary.csv).
+
+import argparse, csv, itertools, json, os
+from datetime import datetime
+import logging
+import multiprocessing as mp
+import numpy as np
+
+from ..core.pbil import PBIL, PBILConfig
+from ..sim.scenario import Scenario
+from ..sim.sim_runner import SumoSimRunner
+from ..utils.logger import setup_multiprocess_logging, worker_configurer
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _scenario_cfg(cfg: dict, scenario: dict) -> dict:
+    """Config của một kịch bản: config gốc + các khoá sumo.* ghi đè."""
+    cfg = json.loads(json.dumps(cfg))
+    cfg["sumo"].update(scenario.get("sumo", {}))
+    cfg["sumo"]["reuse_session"] = True
+    return cfg
+
+
+def _scenario_options(scenario: dict) -> list:
+    """Option SUMO của kịch bản: file demand thay cho route-files trong sumocfg + option riêng."""
+    options = []
+    if scenario.get("route_files"):
+        options += ["-r", ",".join(scenario["route_files"])]
+    return options + list(scenario.get("options", []))
+
+
+def _expand_masks(specs: list, candidates: list) -> list:
+    """
+    Manifest "masks" -> [(tên, config 0/1)]. Mỗi phần tử là:
+      - "all_fixed" / "all_atsc"
+      - {"name": ..., "config": [0/1, ...]}
+      - {"best_configs": path} -> mọi cấu hình trong list_configs của best_configs.json
+    """
+    masks = []
+    for spec in specs:
+        if spec == "all_fixed":
+            masks.append(("all_fixed", [0] * len(candidates)))
+        elif spec == "all_atsc":
+            masks.append(("all_atsc", [1] * len(candidates)))
+        elif "best_configs" in spec:
+            for i, item in enumerate(_load(spec["best_configs"])["list_configs"]):
+                masks.append((f"{spec.get('name', 'best')}_{i}", [int(v) for v in item["config"]]))
+        else:
+            masks.append((spec["name"], [int(v) for v in spec["config"]]))
+
+    for name, config in masks:
+        if len(config) != len(candidates):
+            raise ValueError(f"Mask {name}: {len(config)} values for {len(candidates)} candidate TLS")
+    return masks
+
+
+# Kịch bản (config, Scenario, options) theo tên, gửi một lần/worker
+_worker_scenarios = None
+# Runner/PBIL đã dựng của worker theo tên kịch bản (giữ session SUMO)
+_worker_cache = {}
+
+def _pool_worker_init(log_queue, scenarios):
+    worker_configurer(log_queue)
+    global _worker_scenarios
+    _worker_scenarios = scenarios
+
+
+def _worker_objects(name: str):
+    if name not in _worker_cache:
+        cfg, scenario, _ = _worker_scenarios[name]
+        runner = SumoSimRunner(cfg["sumo"], cfg["controllers"], cfg["pbil"], scenario.net_info, scenario)
+        pbil = PBIL(PBILConfig(**cfg["pbil"]), scenario.candidates, scenario.net_info)
+        _worker_cache[name] = (runner, pbil)
+    return _worker_cache[name]
+
+
+def _run_job(job):
+    """Một ô của ma trận: (scenario, mask_name, config, seed, output_dir) -> dòng kết quả."""
+    logger = logging.getLogger(__name__)
+    scenario, mask_name, config, seed, output_dir = job
+    row = {"scenario": scenario, "mask": mask_name, "seed": seed, "n_atsc": sum(config)}
+
+    try:
+        runner, pbil = _worker_objects(scenario)
+        cfg, sc, options = _worker_scenarios[scenario]
+        candidates = list(sc.candidates)
+        mask = {tls_id: True for tls_id, xi in zip(candidates, config) if xi}
+        if seed is not None:
+            options = options + ["--seed", str(seed)]
+
+        if output_dir:
+            # Ghi thêm file output SUMO (cfg["evaluations"]) của từng ô
+            prefix = os.path.join(output_dir, f"{scenario}_{mask_name}_seed{seed}")
+            res = runner.run_evaluation(mask, cfg.get("evaluations", []), prefix, options=options)
+        else:
+            res = runner.run(mask, options=options)
+        if res is None:
+            raise RuntimeError("simulation failed")
+
+        timings = res.pop("timings", {})
+        outputs = res.pop("outputs", {})
+        row["score"] = float(pbil.calculate_score(res, mask))
+        row.update({k: float(np.mean(v, dtype=np.float64)) for k, v in res.items() if len(v)})
+        # KPI từ file output SUMO (--save-outputs): cột "<option>.<kpi>"
+        for option, kpis in outputs.items():
+            row.update({f"{option}.{k}": v for k, v in kpis.items()})
+        row["wall_s"] = round(timings.get("total", 0.0), 3)
+        row["status"] = "ok"
+        logger.debug("%s / %s / seed %s -> Score: %.6f", scenario, mask_name, seed, row["score"])
+    except Exception:
+        logger.error("%s / %s / seed %s: failed", scenario, mask_name, seed, exc_info=True)
+        row["status"] = "failed"
+    return row
+
+
+def _summary(rows: list) -> list:
+    """Trung bình / độ lệch chuẩn score qua các seed, theo (kịch bản, mask)."""
+    groups = {}
+    for row in rows:
+        if row["status"] == "ok":
+            groups.setdefault((row["scenario"], row["mask"]), []).append(row)
+    out = []
+    for (scenario, mask), group in groups.items():
+        scores = np.array([r["score"] for r in group])
+        out.append({
+            "scenario": scenario,
+            "mask": mask,
+            "n_atsc": group[0]["n_atsc"],
+            "n_seeds": len(scores),
+            "score_mean": float(scores.mean()),
+            "score_std": float(scores.std(ddof=1)) if len(scores) > 1 else 0.0,
+            "score_min": float(scores.min()),
+            "score_max": float(scores.max()),
+        })
+    return sorted(out, key=lambda r: (r["scenario"], r["score_mean"]))
+
+
+def _write_csv(path: str, rows: list) -> None:
+    fields = []
+    for row in rows:
+        fields += [k for k in row if k not in fields]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    listener = None
+    try:
+        ap = argparse.ArgumentParser(description="Đánh giá song song ma trận kịch bản × mask × seed")
+        ap.add_argument("--config", default="configs/config.json")
+        ap.add_argument("--manifest", required=True, help="JSON: scenarios, masks, seeds")
+        ap.add_argument("--output", default=None)
+        ap.add_argument("--processes", type=int, default=None, help="Số mô phỏng chạy đồng thời tối đa")
+        ap.add_argument("--save-outputs", action="store_true",
+                        help="Ghi file output SUMO (cfg['evaluations']) cho từng ô")
+        args = ap.parse_args()
+
+        run_dir = args.output or os.path.join("data", "results", "runs", datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+        log_queue, listener = setup_multiprocess_logging(os.path.join(run_dir, "logs"))
+        logger = logging.getLogger(__name__)
+        logger.info("========== Starting Batch Evaluation ==========")
+
+        cfg = _load(args.config)
+        manifest = _load(args.manifest)
+        logger.info("Loaded configuration from: %s, manifest from: %s", args.config, args.manifest)
+
+        # Kịch bản mặc định: config gốc
+        scenarios, jobs = {}, []
+        seeds = manifest.get("seeds") or [None]
+        out_dir = os.path.join(run_dir, "batch")
+        outputs_dir = os.path.join(out_dir, "outputs") if args.save_outputs else None
+        for scenario in manifest.get("scenarios") or [{"name": "default"}]:
+            scfg = _scenario_cfg(cfg, scenario)
+            # Kịch bản dùng chung file net_info/candidates chỉ nạp + kiểm tra một lần
+            sc = Scenario.load(scfg)
+            candidates = list(sc.candidates)
+            scenarios[scenario["name"]] = (scfg, sc, _scenario_options(scenario))
+
+            masks = _expand_masks(manifest.get("masks", ["all_fixed", "all_atsc"]), candidates)
+            for (mask_name, config), seed in itertools.product(masks, seeds):
+                jobs.append((scenario["name"], mask_name, config, seed, outputs_dir))
+
+        os.makedirs(outputs_dir or out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, "manifest_snapshot.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        if not jobs:
+            logger.warning("Manifest expands to no simulation (no masks/seeds or empty best_configs), nothing to run.")
+            return
+
+        processes = min(args.processes or cfg.get("system", {}).get("max_processes") or mp.cpu_count(), len(jobs))
+        logger.info("%d scenario(s) x mask(s) x %d seed(s) = %d simulation(s) on %d process(es)",
+                    len(scenarios), len(seeds), len(jobs), processes)
+
+        rows = []
+        with mp.Pool(processes=processes, initializer=_pool_worker_init, initargs=(log_queue, scenarios)) as pool:
+            # chunksize=1: mỗi mô phỏng dài, chia đều cho các worker
+            for row in pool.imap_unordered(_run_job, jobs, chunksize=1):
+                rows.append(row)
+                if len(rows) % max(1, len(jobs) // 20) == 0 or len(rows) == len(jobs):
+                    logger.info("Completed %d/%d simulation(s)", len(rows), len(jobs))
+
+        # Thứ tự bảng cố định, không phụ thuộc thứ tự hoàn thành
+        order = {(j[0], j[1], j[3]): i for i, j in enumerate(jobs)}
+        rows.sort(key=lambda r: order[(r["scenario"], r["mask"], r["seed"])])
+        _write_csv(os.path.join(out_dir, "results.csv"), rows)
+        summary = _summary(rows)
+        _write_csv(os.path.join(out_dir, "summary.csv"), summary)
+
+        failed = sum(r["status"] != "ok" for r in rows)
+        if failed:
+            logger.warning("%d simulation(s) failed, see logs", failed)
+        for s in summary:
+            logger.info("%s / %s: score %.6f ± %.6f over %d seed(s)",
+                        s["scenario"], s["mask"], s["score_mean"], s["score_std"], s["n_seeds"])
+        logger.info("Results saved to: %s", out_dir.replace("\\", "/"))
+        logger.info("========== Batch Evaluation Completed ==========")
+
+    except FileNotFoundError as e:
+        logging.getLogger(__name__).error("Missing file: %s", e, exc_info=True)
+    except Exception:
+        logging.getLogger(__name__).error("Unhandled error in main()", exc_info=True)
+    finally:
+        # Dừng listener & shutdown logging
+        if listener is not None:
+            listener.stop()
+        logging.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@
 Tạo file net-information.json từ SUMO net (.net.xml) và detectors (.add.xml)
 - Bám theo cấu trúc net-infomation-example.json (tls → cycle/controller/edges/movements/phases)
 - Không phụ thuộc sumolib; chỉ dùng thư viện chuẩn.
+- File net được đọc một lần bằng iterparse qua sim/net_index.py (có cache).
 """
 
 import argparse
@@ -12,42 +13,23 @@ import json
 import xml.etree.ElementTree as ET
 from collections import defaultdict, OrderedDict
 
+from ..sim.net_index import DEFAULT_CACHE_DIR, DEFAULT_SPEED, load_net_index
+
 MIN_GREEN_DEFAULT = 15
 MAX_GREEN_DEFAULT = 120
 DEFAULT_SAT_FLOW = 1800.0
-DEFAULT_SPEED = 13.89  # m/s, ~50 km/h nếu không thấy speed
 
-def parse_edges_from_net(root):
+def parse_edges_from_net(index):
     """
-    Trích xuất thuộc tính edge (length, speed) từ .net.xml
+    Thuộc tính edge (length, speed) từ chỉ mục net (sim/net_index.py, đã bỏ internal edges)
     Trả về: dict[edge_id] = {"length": float, "speed": float}
     """
-    edge_attr = {}
-    for edge in root.findall("edge"):
-        edge_id = edge.attrib.get("id")
-        # Bỏ qua internal edges dạng id bắt đầu ":"
-        if not edge_id or edge_id.startswith(":"):
-            continue
-
-        # Lấy lane đầu tiên (thường các lane cùng length/speed)
-        lanes = edge.findall("lane")
-        if lanes:
-            # Dùng lane đầu tiên
-            ln = lanes[0]
-            length = float(ln.attrib.get("length", "0.0"))
-            speed = float(ln.attrib.get("speed", str(DEFAULT_SPEED)))
-        else:
-            # Phòng hờ nếu không có lane con
-            length = 0.0
-            speed = DEFAULT_SPEED
-
-        edge_attr[edge_id] = {"length": length, "speed": speed}
-    return edge_attr
+    return {edge_id: {"length": e["length"], "speed": e["speed"]} for edge_id, e in index["edges"].items()}
 
 
-def parse_tl_connections_and_phases(root):
+def parse_tl_connections_and_phases(index):
     """
-    Lấy connections và phases cho từng TLS.
+    Lấy connections và phases cho từng TLS từ chỉ mục net.
     Trả về:
       tls_dict[tls_id] = {
          "connections": [ {link_index, from_edge, to_edge, turn_ratio (optional)} ... ] (đã sort theo link_index)
@@ -55,47 +37,14 @@ def parse_tl_connections_and_phases(root):
          "cycle": tổng thời lượng tất cả phase (bao gồm cả yellow/all-red)
       }
     """
-    # Gom connections theo tls_id trước
-    tls_conns = defaultdict(list)
-    for conn in root.findall("connection"):
-        tl = conn.attrib.get("tl")
-        if not tl:
-            continue
-        rec = {
-            "link_index": int(conn.attrib.get("linkIndex", "-1")),
-            "from_edge": conn.attrib.get("from"),
-            "to_edge": conn.attrib.get("to"),
-        }
-        # SUMO có thể không có turnRatio — nếu có thì dùng
-        if "turnRatio" in conn.attrib:
-            try:
-                rec["turn_ratio"] = float(conn.attrib["turnRatio"])
-            except Exception:
-                pass
-        tls_conns[tl].append(rec)
-
-    # Sort theo link_index
-    for tlid, lst in tls_conns.items():
-        lst.sort(key=lambda x: x["link_index"])
-
+    keys = ("link_index", "from_edge", "to_edge", "turn_ratio")
     tls_info = {}
-    for tl in root.findall("tlLogic"):
-        tls_id = tl.attrib.get("id")
-        if not tls_id:
-            continue
-
-        phases = []
-        cycle = 0.0
-        for i, ph in enumerate(tl.findall("phase")):
-            dur = float(ph.attrib.get("duration", "0"))
-            state = ph.attrib.get("state", "")
-            cycle += dur
-            phases.append({"index": i, "duration": dur, "state": state})
-
+    for tls_id, tl in index["tls"].items():
+        conns = index["connections"].get(tls_id, [])
         tls_info[tls_id] = {
-            "connections": tls_conns.get(tls_id, []),
-            "phases": phases,
-            "cycle": cycle
+            "connections": [{k: c[k] for k in keys if k in c} for c in conns],
+            "phases": tl["phases"],
+            "cycle": tl["cycle"]
         }
     return tls_info
 
@@ -219,15 +168,15 @@ def build_edges_block(connections, edge_attr_map, det_map):
     return edges_block
 
 
-def build_tls_json(net_file, detector_file, controller="max_pressure"):
+def build_tls_json(net_file, detector_file, controller="max_pressure", cache_dir=DEFAULT_CACHE_DIR):
     """
     Lắp đầy cấu trúc JSON đầu ra theo đúng mẫu.
     """
-    tree = ET.parse(net_file)
-    root = tree.getroot()
+    # Một lần iterparse (hoặc đọc từ cache theo hash của file net)
+    index = load_net_index(net_file, cache_dir)
 
-    edge_attr_map = parse_edges_from_net(root)
-    tls_raw = parse_tl_connections_and_phases(root)
+    edge_attr_map = parse_edges_from_net(index)
+    tls_raw = parse_tl_connections_and_phases(index)
     det_map = parse_detectors(detector_file)
 
     out = OrderedDict()
@@ -267,9 +216,12 @@ def main():
     ap.add_argument("--detectors", required=True, help="Đường dẫn file .add.xml chứa laneAreaDetector")
     ap.add_argument("--out", required=True, help="Đường dẫn file JSON đầu ra")
     ap.add_argument("--controller", default="max_pressure", help="Tên controller muốn ghi vào JSON (mặc định: max_pressure)")
+    ap.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Thư mục cache chỉ mục net (theo hash file net)")
+    ap.add_argument("--no-cache", action="store_true", help="Luôn parse lại file net")
     args = ap.parse_args()
 
-    data = build_tls_json(args.net, args.detectors, controller=args.controller)
+    data = build_tls_json(args.net, args.detectors, controller=args.controller,
+                          cache_dir=None if args.no_cache else args.cache_dir)
     with open(args.out, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
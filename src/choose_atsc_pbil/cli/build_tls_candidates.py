@@ -1,7 +1,8 @@
-import xml.etree.ElementTree as ET
 import argparse
 import json
 
+from ..sim.net_index import DEFAULT_CACHE_DIR, load_net_index
+
 # Function to save traffic light system candidates to a file
 # Example: {"candidate_tls_ids": {"24": 0.5, "124": 0.5, "8": 0.5, "18": 0.5, "12": 0.5, "63": 0.5}}
 def save_tls_candidates(candidates, output_file):
@@ -12,24 +13,18 @@ def save_tls_candidates(candidates, output_file):
         json.dump(dict_candidates, f, ensure_ascii=False, indent=2)
 
 # Function to build traffic light system candidates from an XML file
-def build_tls_candidates(xml_file):
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-
-    candidates = []
-    for tls in root.findall("tlLogic"):
-        tls_id = tls.attrib.get("id")
-        if tls_id:
-            candidates.append(tls_id)
-
-    return candidates
+# (tlLogic theo thứ tự trong file, từ chỉ mục net có cache)
+def build_tls_candidates(xml_file, cache_dir=DEFAULT_CACHE_DIR):
+    return list(load_net_index(xml_file, cache_dir)["tls"])
 
 def main():
     ap = argparse.ArgumentParser(description="Build net-information.json từ SUMO .net.xml và .add.xml (detectors)")
     ap.add_argument("--net", required=True, help="Path to the SUMO .net.xml file")
     ap.add_argument("--output", required=True, help="Path to the output file")
+    ap.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Net index cache directory (keyed by net file hash)")
+    ap.add_argument("--no-cache", action="store_true", help="Always re-parse the net file")
     args = ap.parse_args()
 
-    candidates = build_tls_candidates(args.net)
+    candidates = build_tls_candidates(args.net, None if args.no_cache else args.cache_dir)
     save_tls_candidates(candidates, args.output)
     print("✅ Đã tạo: ", args.output)
@@ -2,7 +2,9 @@ import argparse, json, os, time
 from datetime import datetime
 import logging
 import multiprocessing as mp
+import numpy as np
 
+from ..sim.scenario import Scenario
 from ..sim.sim_runner import SumoSimRunner
 from ..utils.logger import setup_logging
 from ..core.pbil import PBIL, PBILConfig
@@ -11,53 +13,60 @@ def _load_config(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def run_baseline_1(cfg, net_info, run_dir):
+def _json_default(obj):
+    # Chuỗi metric là np.ndarray float32
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def run_baseline_1(cfg, scenario, run_dir):
     """Run Baseline 1: all fixed-time"""
     try:
-        runner = SumoSimRunner(cfg["sumo"], cfg["controllers"], cfg["pbil"], net_info)
+        runner = SumoSimRunner(cfg["sumo"], cfg["controllers"], cfg["pbil"], scenario.net_info, scenario)
         pbil_cfg = PBILConfig(**cfg["pbil"])
-        pbil = PBIL(pbil_cfg, {})
+        pbil = PBIL(pbil_cfg, {}, scenario.net_info)
         
         mask_none = {}
         r1 = runner.run_evaluation(mask_none, cfg["evaluations"], os.path.join(run_dir, "output_all_fixed"))
-        score1 = pbil.calculate_score(r1)
+        score1 = pbil.calculate_score(r1, mask_none)
         r1["score"] = score1
         
         with open(os.path.join(run_dir, "baseline_all_fixed.json"), "w", encoding="utf-8") as f:
-            json.dump(r1, f, indent=2)
+            json.dump(r1, f, indent=2, default=_json_default)
         
         return ("Baseline 1", True, None)
     except Exception as e:
         return ("Baseline 1", False, str(e))
 
-def run_baseline_2(cfg, net_info, run_dir):
+def run_baseline_2(cfg, scenario, run_dir):
     """Run Baseline 2: all ATSC"""
     try:
-        runner = SumoSimRunner(cfg["sumo"], cfg["controllers"], cfg["pbil"], net_info)
+        runner = SumoSimRunner(cfg["sumo"], cfg["controllers"], cfg["pbil"], scenario.net_info, scenario)
         pbil_cfg = PBILConfig(**cfg["pbil"])
-        pbil = PBIL(pbil_cfg, {})
+        pbil = PBIL(pbil_cfg, {}, scenario.net_info)
         
-        candidate_tls_ids = _load_config(cfg["sumo"]["candidates_file"])["candidate_tls_ids"]
-        mask_candidate = {k: True for k in candidate_tls_ids}
+        mask_candidate = {k: True for k in scenario.candidates}
         r2 = runner.run_evaluation(mask_candidate, cfg["evaluations"], os.path.join(run_dir, "output_all_atsc"))
-        score2 = pbil.calculate_score(r2)
+        score2 = pbil.calculate_score(r2, mask_candidate)
         r2["score"] = score2
         
         with open(os.path.join(run_dir, "baseline_all_atsc.json"), "w", encoding="utf-8") as f:
-            json.dump(r2, f, indent=2)
+            json.dump(r2, f, indent=2, default=_json_default)
         
         return ("Baseline 2", True, None)
     except Exception as e:
         return ("Baseline 2", False, str(e))
 
-def run_pbil_atsc(cfg, net_info, run_dir, best_file, number):
+def run_pbil_atsc(cfg, scenario, run_dir, best_file, number):
     """Run PBIL ATSC"""
     try:
-        runner = SumoSimRunner(cfg["sumo"], cfg["controllers"], cfg["pbil"], net_info)
+        runner = SumoSimRunner(cfg["sumo"], cfg["controllers"], cfg["pbil"], scenario.net_info, scenario)
         pbil_cfg = PBILConfig(**cfg["pbil"])
-        pbil = PBIL(pbil_cfg, {})
+        pbil = PBIL(pbil_cfg, {}, scenario.net_info)
         
-        candidate_tls_ids = _load_config(cfg["sumo"]["candidates_file"])["candidate_tls_ids"]
+        candidate_tls_ids = list(scenario.candidates)
         bests = _load_config(best_file)["list_configs"][number]["config"]
         
         mask_candidate = {}
@@ -66,11 +75,11 @@ def run_pbil_atsc(cfg, net_info, run_dir, best_file, number):
                 mask_candidate[k] = True
         
         r3 = runner.run_evaluation(mask_candidate, cfg["evaluations"], os.path.join(run_dir, "output_pbil_atsc"))
-        score3 = pbil.calculate_score(r3)
+        score3 = pbil.calculate_score(r3, mask_candidate)
         r3["score"] = score3
         
         with open(os.path.join(run_dir, "pbil_atsc.json"), "w", encoding="utf-8") as f:
-            json.dump(r3, f, indent=2)
+            json.dump(r3, f, indent=2, default=_json_default)
         
         return ("PBIL ATSC", True, None)
     except Exception as e:
@@ -101,7 +110,8 @@ def main():
         cfg = _load_config(args.config)
         logger.info("Loaded configuration from: %s", args.config)
 
-        net_info = _load_config(cfg["sumo"]["net_info_file"])
+        # net_info + candidates nạp và kiểm tra một lần, gửi cho cả ba process
+        scenario = Scenario.load(cfg)
         logger.info("Loaded network information from: %s", cfg["sumo"]["net_info_file"])
 
         # Tạo thư mục cho evaluation
@@ -116,9 +126,9 @@ def main():
         
         with mp.Pool(processes=3) as pool:
             # Submit all three tasks
-            result1 = pool.apply_async(run_baseline_1, (cfg, net_info, run_dir))
-            result2 = pool.apply_async(run_baseline_2, (cfg, net_info, run_dir))
-            result3 = pool.apply_async(run_pbil_atsc, (cfg, net_info, run_dir, args.best, args.number))
+            result1 = pool.apply_async(run_baseline_1, (cfg, scenario, run_dir))
+            result2 = pool.apply_async(run_baseline_2, (cfg, scenario, run_dir))
+            result3 = pool.apply_async(run_pbil_atsc, (cfg, scenario, run_dir, args.best, args.number))
             
             # Collect results
             results = [result1.get(), result2.get(), result3.get()]
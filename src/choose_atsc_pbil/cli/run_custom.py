@@ -2,6 +2,7 @@ import argparse, json, os, time
 from datetime import datetime
 import logging
 
+from ..sim.scenario import Scenario
 from ..sim.sim_runner import SumoSimRunner
 from ..utils.logger import setup_logging
 from ..core.pbil import PBIL, PBILConfig
@@ -33,7 +34,8 @@ def main():
         cfg = _load_config(args.config)
         logger.info("Loaded configuration from: %s", args.config)
 
-        net_info = _load_config(cfg["sumo"]["net_info_file"])
+        scenario = Scenario.load(cfg)
+        net_info = scenario.net_info
         logger.info("Loaded network information from: %s", cfg["sumo"]["net_info_file"])
 
         # Tạo thư mục cho evaluation
@@ -44,19 +46,18 @@ def main():
         # logger.info("Setting up run directory: %s", run_dir.replace("\\", "/"))
 
         # Initial SumoSimRunner
-        runner = SumoSimRunner(cfg["sumo"], cfg["controllers"], cfg["pbil"], net_info)
+        runner = SumoSimRunner(cfg["sumo"], cfg["controllers"], cfg["pbil"], net_info, scenario)
 
         # Init PBIL
         pbil_cfg = PBILConfig(**cfg["pbil"])
-        pbil = PBIL(pbil_cfg, {})
+        pbil = PBIL(pbil_cfg, {}, net_info)
 
         # Baseline 2: all ATSC
         try:
             logger.info("Running Baseline 2: all ATSC")
-            candidate_tls_ids = _load_config(cfg["sumo"]["candidates_file"])["candidate_tls_ids"]
-            mask_candidate = {k: True for k in candidate_tls_ids}
+            mask_candidate = {k: True for k in scenario.candidates}
             r2 = runner.run_evaluation(mask_candidate, cfg["evaluations"], os.path.join(run_dir, "output_all_atsc"))
-            score2 = pbil.calculate_score(r2)
+            score2 = pbil.calculate_score(r2, mask_candidate)
             r2["score"] = score2
         except Exception as e:
             logger.error("Error occurred while running Baseline 2: %s", e)
@@ -1,13 +1,20 @@
 # choose_atsc_pbil/cli/run_custom.py
 
-import argparse, json, os
+import argparse, json, os, queue
 from datetime import datetime
+from statistics import NormalDist
 import numpy as np
 import multiprocessing as mp
 import logging
 
 from ..core.pbil import PBIL, PBILConfig
+from ..core.backends import BrokerBackend, LocalBackend, make_bundle
+from ..core.fitness_store import FitnessStore, scenario_fingerprint
+from ..core.result_log import ResultLog, read_individuals
 from ..core.selection import pick_best_worst
+from ..core.evaluation import EarlyStopper
+from ..core.surrogate import RidgeSurrogate, training_data, screen
+from ..sim.scenario import Scenario, ScenarioError
 from ..sim.sim_runner import SumoSimRunner
 from ..utils.logger import setup_multiprocess_logging, worker_configurer
 
@@ -20,33 +27,531 @@ def _save(path, obj):
     with open(path, "w", encoding="utf-8") as f:
         json.dump(obj, f, indent=2)
 
-def _pool_worker_init(log_queue):
+def _save_atomic(path, obj):
+    # Ghi ra file tạm rồi thay thế -> bị kill giữa chừng vẫn còn bản cũ nguyên vẹn
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+# Runner riêng của mỗi worker, giữ SUMO đã nạp suốt cả lần chạy PBIL
+_worker_runner = None
+# Score tốt nhất hiện tại (mp.Value dùng chung), làm ngưỡng dừng sớm
+_worker_incumbent = None
+# PBIL (chỉ dùng cfg/calculate_score) và danh sách candidate, gửi một lần/worker
+_worker_pbil = None
+_worker_candidates = None
+
+def _pool_worker_init(log_queue, runner, incumbent, pbil, candidates):
     # Mỗi process trong Pool sẽ tự cấu hình logger 1 lần
     worker_configurer(log_queue)
+    _set_worker_state(runner, incumbent, pbil, candidates)
 
 
-def _run_simulation(proc_idx, x, scores_list, candidates, runner, pbil: PBIL):
+def _set_worker_state(runner, incumbent, pbil, candidates):
+    # Dùng chung cho worker của Pool và worker của broker (run-worker)
+    global _worker_runner, _worker_incumbent, _worker_pbil, _worker_candidates
+    _worker_runner = runner
+    _worker_incumbent = incumbent
+    _worker_pbil = pbil
+    _worker_candidates = list(candidates)
+
+
+def _early_stopper():
+    cfg = _worker_pbil.cfg
+    metric = _worker_pbil.objective.stop_metric
+    if not cfg.early_stop or _worker_incumbent is None or metric is None:
+        return None
+
+    def threshold():
+        inc = _worker_incumbent.value
+        return inc + abs(inc) * cfg.early_stop_margin
+
+    return EarlyStopper(metric, _worker_runner.n_samples(), threshold,
+                        bound=cfg.early_stop_bound, min_fraction=cfg.early_stop_min_fraction)
+
+
+def _update_incumbent(incumbent, record):
+    # Chỉ score đầy đủ mới được làm incumbent
+    if record is None or record.get("early_stopped"):
+        return
+    with incumbent.get_lock():
+        if record["score"] < incumbent.value:
+            incumbent.value = record["score"]
+
+
+def _run_simulation(task):
     # Logger đã được cấu hình bởi _pool_worker_init
     logger = logging.getLogger(__name__)
+    proc_idx, x, fidelity, seed = task
 
     try:
-        mask = {tls_id: bool(xi) for tls_id, xi in zip(candidates, x)}
-        res = runner.run(mask)
-        score = pbil.calculate_score(res)
-
-        logger.debug("Process %d: Completed -> Score: %.6f", proc_idx + 1, score)
+        mask = {tls_id: bool(xi) for tls_id, xi in zip(_worker_candidates, x)}
+        # Score fidelity thấp / một replication không so được với incumbent -> không dừng sớm
+        stopper = None if fidelity or seed is not None else _early_stopper()
+        kwargs = dict(fidelity or {})
+        if seed is not None:
+            kwargs["options"] = list(kwargs.get("options", [])) + ["--seed", str(seed)]
+        res = _worker_runner.run(mask, stop_check=stopper, **kwargs)
+        stopped_at = res.pop("stopped_at", None)
+        timings = res.pop("timings", {})
+
+        if stopped_at is None:
+            score = _worker_pbil.calculate_score(res, mask)
+            logger.debug("Process %d: Completed -> Score: %.6f", proc_idx + 1, score)
+        else:
+            # Score là cận dưới tại thời điểm dừng (đã kém hơn ngưỡng)
+            score = stopper.score_bound()
+            logger.debug("Process %d: Early stopped at t=%.1f -> Score bound: %.6f", proc_idx + 1, stopped_at, score)
 
         # Got mean parameters from res to save (IF not the memory is over limit)
-        scores_list.append(
-            {
-                "config": list(x),
-                "score": float(score),
-                "res": {k: np.mean(v) for k, v in res.items()}
-            }
-        )
+        record = {
+            "config": list(x),
+            "score": float(score),
+            "res": {k: float(np.mean(v, dtype=np.float64)) for k, v in res.items()},
+            "early_stopped": stopped_at is not None,
+            "timings": {k: round(v, 4) for k, v in timings.items()}
+        }
+        if seed is not None:
+            record["seed"] = seed
+        # Chuỗi thời gian đầy đủ (float32), chỉ gửi về khi cần lưu
+        if _worker_pbil.cfg.save_timeseries:
+            record["series"] = res
+        logger.debug("Process %d: Timings %s", proc_idx + 1, record["timings"])
+        return record
 
     except Exception:
         logger.error("Process %d: Failed during simulation for x=%s", proc_idx + 1, list(x), exc_info=True)
+        return None
+
+
+def _finish_generation(g, scores, best, worst, pbil: PBIL, history: dict, log: ResultLog):
+    """Ghi log, cập nhật lịch sử và lưu kết quả sau mỗi lần cập nhật p."""
+    logger = logging.getLogger(__name__)
+
+    logger.info("Best:  %s -> Score: %.6f", list(best["config"]), best["score"])
+    if worst["score"] is None:
+        logger.info("Worst: %s -> Screening score: %.6f", list(worst["config"]), worst["score_low"])
+    else:
+        logger.info("Worst: %s -> Score: %.6f", list(worst["config"]), worst["score"])
+    logger.debug("Probability Vector: %s", pbil.p)
+    logger.info("Updated Probability Vector.")
+
+    history["best_hist"].append(best["score"])
+
+    log.write_generation({
+        "gen": g,
+        "best_score": float(best["score"]),
+        "best_config": list(best["config"]),
+        "worst_config": list(worst["config"]),
+        "p": pbil.p.tolist(),
+    })
+
+    return _record_individuals(g, scores, pbil, history, log)
+
+
+def _record_individuals(g, scores, pbil: PBIL, history: dict, log: ResultLog):
+    """
+    Ghi các cá thể đã đánh giá vào lịch sử + log, cập nhật best_configs và checkpoint.
+    Gọi cả khi p không được cập nhật (cửa sổ toàn cá thể cũ, không cá thể nào chạy xong)
+    để các mô phỏng đã tốn vẫn có trong kết quả và được tính vào ngân sách khi resume.
+    """
+    # Add to data_history
+    data_history = history["data_history"]
+    entries = []
+    for s in scores:
+        entry = {
+            "gen": g,
+            "config": list(s["config"]),
+            "score": None if s["score"] is None else float(s["score"]),
+            "res": s["res"],
+            "early_stopped": bool(s.get("early_stopped", False)),
+            "timings": s.get("timings", {})
+        }
+        # Multi-fidelity: score sàng lọc và mức fidelity của "score"
+        if "score_low" in s:
+            entry["score_low"] = float(s["score_low"])
+            entry["fidelity"] = s["fidelity"]
+        # Replication: khoảng tin cậy của score và số seed đã chạy
+        if "n_reps" in s:
+            entry["score_ci"] = float(s["score_ci"])
+            entry["n_reps"] = s["n_reps"]
+        entries.append(entry)
+        log.write_individual(entry)
+    data_history.extend(entries)
+
+    if pbil.cfg.save_timeseries:
+        log.write_timeseries(g, scores)
+
+    # Chỉ so cá thể mới với các cấu hình tốt nhất hiện có (không duyệt lại cả lịch sử)
+    best_configs = _best_configs(entries, history["best_configs"])
+    history["best_configs"] = best_configs
+
+    # Lưu kết quả (best_configs.json nhỏ nên ghi đè được)
+    if best_configs is not None:
+        _save(os.path.join(log.run_dir, "best_configs.json"), best_configs)
+
+    # Checkpoint ghi sau cùng, kèm vị trí cuối các file log đã flush
+    _save_atomic(os.path.join(log.run_dir, "checkpoint.json"), {
+        "generation": g,
+        "n_evaluated": len(data_history),
+        "pbil": pbil.get_state(),
+        "best_hist": history["best_hist"],
+        "log_offsets": log.offsets(),
+    })
+
+    return best_configs
+
+
+def _best_configs(entries: list, prev: dict = None) -> dict:
+    # Tìm cấu hình tốt nhất (chỉ xét score đầy đủ, bỏ cận dưới của cá thể dừng sớm)
+    pool = (prev["list_configs"] if prev else []) + [
+        x for x in entries if x["score"] is not None and not x.get("early_stopped")]
+    if not pool:
+        return prev
+    best_score = min(x["score"] for x in pool)
+    return {
+        "score": best_score,
+        "list_configs": [x for x in pool if x["score"] == best_score]
+    }
+
+
+def _restore(run_dir: str, pbil: PBIL, history: dict) -> dict:
+    """
+    Nạp checkpoint của một lần chạy bị dừng: p, RNG, best_hist, lịch sử.
+    Bỏ các bản ghi của thế hệ chưa kịp ghi checkpoint. Trả về checkpoint.
+    """
+    ckpt = _load(os.path.join(run_dir, "checkpoint.json"))
+    g = ckpt["generation"]
+
+    pbil.set_state(ckpt["pbil"])
+    history["best_hist"] = list(ckpt["best_hist"])
+    history["data_history"] = [x for x in read_individuals(run_dir) if x["gen"] <= g]
+    if history["data_history"]:
+        history["best_configs"] = _best_configs(history["data_history"])
+    return ckpt
+
+
+def _fit_surrogate(pbil: PBIL, data_history: list):
+    """Huấn luyện surrogate trên data_history; None nếu chưa bật hoặc chưa đủ dữ liệu."""
+    cfg = pbil.cfg
+    if not cfg.surrogate:
+        return None
+    X, y = training_data(data_history)
+    if len(y) < cfg.surrogate_min_train:
+        return None
+    return RidgeSurrogate(alpha=cfg.surrogate_alpha, interactions=cfg.surrogate_interactions).fit(X, y)
+
+
+def _low_fidelity(cfg: PBILConfig) -> dict:
+    """Tham số SumoSimRunner.run cho lần chạy sàng lọc."""
+    fidelity = {"end": cfg.fidelity_end}
+    if cfg.fidelity_scale is not None:
+        fidelity["options"] = ["--scale", str(cfg.fidelity_scale)]
+    return fidelity
+
+
+def _fidelity_top_k(cfg: PBILConfig, g: int) -> int:
+    if cfg.fidelity_schedule:
+        return cfg.fidelity_schedule[min(g, len(cfg.fidelity_schedule) - 1)]
+    return cfg.fidelity_top_k
+
+
+def _evaluate(backend, xs, incumbent, fidelity=None):
+    """Gửi các cá thể cho backend đánh giá, chờ xong và trả về list record (bỏ các lần chạy lỗi)."""
+    logger = logging.getLogger(__name__)
+    tasks = [(i, x, fidelity, None) for i, x in enumerate(xs)]
+    logger.info("Waiting for %d process(es) to complete...", len(tasks))
+
+    # Worker trả record trực tiếp, nhận theo thứ tự hoàn thành
+    records = {}    # (1,0,1) -> {"config": [1,0,1], "score": 98.0, "res": {}}
+    for rec in backend.map_unordered(tasks):
+        if rec is None:
+            continue
+        # Chỉ score đầy đủ mới được làm incumbent
+        if not fidelity:
+            _update_incumbent(incumbent, rec)
+        records[tuple(rec["config"])] = rec
+
+    # Trả về theo thứ tự gửi (không theo thứ tự hoàn thành) để best/worst khi
+    # bằng điểm không phụ thuộc vào tốc độ worker -> chạy lại/resume cho cùng kết quả
+    return [records[tuple(x)] for x in xs if tuple(x) in records]
+
+
+def _aggregate(x, reps: list, z: float) -> dict:
+    """Gộp các replication của một mask: score = mean, score_ci = nửa độ rộng khoảng tin cậy."""
+    scores = np.array([r["score"] for r in reps])
+    n = len(scores)
+    return {
+        "config": list(x),
+        "score": float(scores.mean()),
+        "score_ci": float(z * scores.std(ddof=1) / np.sqrt(n)) if n > 1 else float("inf"),
+        "n_reps": n,
+        "res": {k: float(np.mean([r["res"][k] for r in reps])) for k in reps[0]["res"]},
+        "early_stopped": False,
+        "timings": {k: round(sum(r["timings"].get(k, 0.0) for r in reps), 4) for k in reps[0]["timings"]},
+    }
+
+
+def _evaluate_replicated(backend, xs, pbil: PBIL, incumbent):
+    """
+    Chạy mỗi mask với `replications` seed đầu tiên (mọi mask dùng chung bộ seed),
+    sau đó mỗi vòng chạy thêm một seed cho các mask có khoảng tin cậy chồng lên
+    mask tốt nhất (và cho chính mask tốt nhất), tới khi tách được hoặc hết seed.
+    """
+    logger = logging.getLogger(__name__)
+    cfg = pbil.cfg
+    seeds = list(cfg.replication_seeds or range(cfg.replication_max))[:cfg.replication_max]
+    z = NormalDist().inv_cdf(0.5 + cfg.replication_confidence / 2)
+
+    xs = [tuple(x) for x in xs]
+    reps = {x: [] for x in xs}
+    used = {x: 0 for x in xs}     # số seed đã gửi (kể cả lần chạy lỗi)
+    pending = [x for x in xs for _ in range(min(cfg.replications, len(seeds)))]
+    agg = {}
+    n_round = 0
+
+    while pending:
+        tasks = []
+        for x in pending:
+            tasks.append((len(tasks), x, None, seeds[used[x]]))
+            used[x] += 1
+        logger.info("Replication round %d: waiting for %d simulation(s)...", n_round + 1, len(tasks))
+        for rec in backend.map_unordered(tasks):
+            if rec is not None:
+                reps[tuple(rec["config"])].append(rec)
+
+        agg = {x: _aggregate(x, r, z) for x, r in reps.items() if r}
+        if not agg:
+            break
+        best = min(agg.values(), key=lambda a: a["score"])
+        best_x = tuple(best["config"])
+        upper = best["score"] + best["score_ci"]
+
+        # Chỉ các mask còn seed và chưa tách được khỏi mask tốt nhất
+        pending = [x for x, a in agg.items()
+                   if x != best_x and used[x] < len(seeds) and a["score"] - a["score_ci"] <= upper]
+        if pending and used[best_x] < len(seeds):
+            pending.append(best_x)
+        n_round += 1
+
+    for a in agg.values():
+        _update_incumbent(incumbent, a)
+    logger.info("Replications: %d simulation(s) for %d mask(s) in %d round(s)",
+                sum(used.values()), len(xs), n_round)
+    return [agg[x] for x in xs if x in agg]
+
+
+def _evaluate_full(backend, xs, pbil: PBIL, incumbent):
+    """Đánh giá đầy đủ: replicated nếu bật replications, ngược lại một lần chạy mỗi mask."""
+    if pbil.cfg.replications > 1:
+        return _evaluate_replicated(backend, xs, pbil, incumbent)
+    return _evaluate(backend, xs, incumbent)
+
+
+def _run_multi_fidelity(backend, xs, pbil: PBIL, incumbent, g: int):
+    """
+    Sàng lọc xs bằng mô phỏng fidelity thấp, chỉ top-k (score thấp nhất) chạy đầy đủ.
+    Mỗi record có "score_low"; cá thể không được chọn có score = None.
+    """
+    logger = logging.getLogger(__name__)
+    cfg = pbil.cfg
+
+    low = _evaluate(backend, xs, incumbent, fidelity=_low_fidelity(cfg))
+    low.sort(key=lambda s: s["score"])
+    finalists = [tuple(s["config"]) for s in low[:_fidelity_top_k(cfg, g)]]
+    logger.info("Multi-fidelity: %d/%d individual(s) promoted to full horizon", len(finalists), len(low))
+
+    full = {tuple(s["config"]): s for s in _evaluate_full(backend, finalists, pbil, incumbent)}
+
+    records = []
+    for s in low:
+        rec = full.get(tuple(s["config"]))
+        if rec is None:
+            rec = dict(s, score=None, fidelity="low")
+        else:
+            rec = dict(rec, fidelity="full")
+        rec["score_low"] = s["score"]
+        records.append(rec)
+    return records
+
+
+def _run_generations(backend, pbil: PBIL, store: FitnessStore, incumbent, history: dict, log: ResultLog,
+                     start_gen: int = 0):
+    """PBIL đồng bộ: chạy hết quần thể của một thế hệ rồi mới cập nhật p."""
+    logger = logging.getLogger(__name__)
+    cfg = pbil.cfg
+    best_configs = None
+
+    for g in range(start_gen, cfg.Gmax):
+        logger.info("__________ Generation %d/%d: Starting __________", g + 1, cfg.Gmax)
+
+        surrogate = _fit_surrogate(pbil, history["data_history"])
+        size = cfg.population * max(cfg.surrogate_oversample, 1) if surrogate is not None else None
+        pop = pbil.sample_population(size=size)
+
+        # Xóa những cá thể trùng lặp
+        pop = list(set(tuple(x.tolist()) for x in pop))  # unique
+
+        cached_scores = []
+        to_run = []
+        store.reset_counters()
+
+        for i, x in enumerate(pop):
+            # Cache: nếu đã có trong store thì không đưa vào Pool
+            cached = store.get(x)
+            if cached is not None:
+                cached_scores.append(cached)
+                _update_incumbent(incumbent, cached)
+                logger.debug("Process %d: %s -> Skipped (cached) -> Score: %.6f", i + 1, list(x), cached["score"])
+                continue
+            to_run.append(x)
+
+        # Surrogate: chỉ mô phỏng thật những cá thể hứa hẹn/bất định nhất
+        if surrogate is not None:
+            n_eval = cfg.surrogate_n_eval or cfg.population
+            n_sampled = len(to_run)
+            to_run = screen(surrogate, to_run, n_eval, explore=cfg.surrogate_explore)
+            logger.info("Surrogate: selected %d/%d sampled individual(s) for simulation", len(to_run), n_sampled)
+
+        logger.info("Fitness cache: %d hit(s), %d miss(es)", store.hits, store.misses)
+
+        if cfg.multi_fidelity:
+            new_scores = _run_multi_fidelity(backend, to_run, pbil, incumbent, g)
+        else:
+            new_scores = _evaluate_full(backend, to_run, pbil, incumbent)
+
+        # Lưu kết quả mới (score đầy đủ) vào store
+        for s in new_scores:
+            if s["score"] is not None and not s["early_stopped"]:
+                store.put(s["config"], s["score"], s["res"])
+        n_stopped = sum(s["early_stopped"] for s in new_scores)
+        if n_stopped:
+            logger.info("Early stopped %d/%d simulation(s)", n_stopped, len(new_scores))
+        scores = cached_scores + new_scores
+
+        # Best/Worst theo score đầy đủ; cá thể chỉ có score sàng lọc vẫn có thể là worst
+        full_scores = [s for s in scores if s["score"] is not None]
+        best, worst = pick_best_worst(full_scores)
+        screened_out = [s for s in scores if s["score"] is None]
+        if screened_out:
+            worst = max(screened_out, key=lambda s: s["score_low"])
+
+        # Không cá thể nào chạy xong (đều lỗi hoặc dừng sớm): bỏ qua cập nhật p của thế hệ này
+        if best is None:
+            logger.warning("Generation %d: no individual finished a full simulation, probability vector unchanged.",
+                           g + 1)
+            best_configs = _record_individuals(g, scores, pbil, history, log)
+            continue
+
+        # Cập nhật vector xác suất
+        pbil.update(np.array(best["config"]), np.array(worst["config"]))
+
+        best_configs = _finish_generation(g, scores, best, worst, pbil, history, log)
+
+        # Kiểm tra hội tụ
+        if pbil.converged(history["best_hist"], eps=cfg.convergence_eps):
+            logger.info("STOP: Convergence reached (eps=%.6f).", cfg.convergence_eps)
+            break
+
+    return best_configs
+
+
+def _run_async(backend, pbil: PBIL, store: FitnessStore, incumbent, max_procs: int, history: dict, log: ResultLog,
+               start_gen: int = 0, n_done: int = 0):
+    """
+    PBIL steady-state: luôn giữ max_procs job đang chạy, cá thể mới được
+    sinh ngay khi một worker rảnh; p được cập nhật mỗi window_size cá thể xong.
+    Tổng số cá thể bằng Gmax * population như chế độ đồng bộ
+    (trừ n_done cá thể đã chạy trước khi resume).
+    """
+    logger = logging.getLogger(__name__)
+    cfg = pbil.cfg
+    budget = max(cfg.Gmax * cfg.population - n_done, 0)
+
+    done_q = queue.Queue()      # (x, record, version, from_cache)
+    in_flight = {}              # x -> số job đang chạy
+    running = 0                 # số job đang chạy (một mask có thể chạy nhiều job)
+    window = []
+    submitted = 0
+    completed = 0
+    g = start_gen
+    best_configs = None
+
+    def submit():
+        nonlocal submitted, running
+        # Tránh sinh lại mask đang chạy (thử vài lần)
+        for _ in range(10):
+            x = tuple(pbil.sample_one().tolist())
+            if x not in in_flight:
+                break
+        submitted += 1
+        version = pbil.version
+
+        cached = store.get(x)
+        if cached is not None:
+            logger.debug("Individual %d: %s -> Skipped (cached) -> Score: %.6f", submitted, list(x), cached["score"])
+            done_q.put((x, cached, version, True))
+            return
+
+        in_flight[x] = in_flight.get(x, 0) + 1
+        running += 1
+        logger.debug("Individual %d: %s -> Starting...", submitted, list(x))
+        backend.submit(
+            (submitted - 1, x, None, None),
+            callback=lambda rec, x=x, v=version: done_q.put((x, rec, v, False)),
+            error_callback=lambda e, x=x, v=version: done_q.put((x, None, v, False)),
+        )
+
+    def fill():
+        while submitted < budget and running < max_procs:
+            submit()
+
+    fill()
+    while completed < submitted:
+        x, rec, version, from_cache = done_q.get()
+        completed += 1
+
+        if not from_cache:
+            running -= 1
+            in_flight[x] -= 1
+            if in_flight[x] == 0:
+                del in_flight[x]
+            if rec is not None and not rec["early_stopped"]:
+                store.put(rec["config"], rec["score"], rec["res"])
+
+        _update_incumbent(incumbent, rec)
+        if rec is not None:
+            rec["version"] = version
+            window.append(rec)
+
+        # Worker vừa rảnh -> gửi cá thể tiếp theo ngay
+        fill()
+
+        if len(window) >= cfg.window_size or (completed == submitted and window):
+            logger.info("__________ Window %d: %d individual(s), %d running __________",
+                        g + 1, len(window), running)
+            logger.info("Fitness cache: %d hit(s), %d miss(es)", store.hits, store.misses)
+            store.reset_counters()
+
+            updated = pbil.update_window(window)
+            scores = [{k: v for k, v in s.items() if k != "version"} for s in window]
+            window = []
+            if updated is None:
+                # Không cập nhật p nhưng các mô phỏng đã chạy vẫn được ghi lại
+                logger.warning("Window %d: no fresh individual finished a full simulation, probability vector unchanged.",
+                               g + 1)
+                best_configs = _record_individuals(g, scores, pbil, history, log)
+            else:
+                best, worst = updated
+                best_configs = _finish_generation(g, scores, best, worst, pbil, history, log)
+
+                if pbil.converged(history["best_hist"], eps=cfg.convergence_eps):
+                    logger.info("STOP: Convergence reached (eps=%.6f).", cfg.convergence_eps)
+                    break
+            g += 1
+
+    return best_configs
 
 
 def main():
@@ -58,10 +563,13 @@ def main():
         ap = argparse.ArgumentParser()
         ap.add_argument("--config", default="configs/config.json")
         ap.add_argument("--output", default=None)
+        ap.add_argument("--resume", default=None, help="Chạy tiếp một run_dir bị dừng giữa chừng")
         args = ap.parse_args()
 
         # Thiết lập thư mục chạy
-        if args.output:
+        if args.resume:
+            run_dir = args.resume
+        elif args.output:
             run_dir = args.output
         else:
             run_dir = os.path.join("data", "results", "runs", datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
@@ -73,18 +581,20 @@ def main():
         logger.info("========== Starting choose ATSC using PBIL ==========")
         logger.info("__________ Setting up configuration __________")
 
-        # Load thông tin
-        cfg = _load(args.config)
-        logger.info("Loaded configuration from: %s", args.config)
+        # Load thông tin (resume: dùng đúng cấu hình đã chạy)
+        config_path = os.path.join(run_dir, "config", "run_config_snapshot.json") if args.resume else args.config
+        cfg = _load(config_path)
+        logger.info("Loaded configuration from: %s", config_path)
 
-        net_info = _load(cfg["sumo"]["net_info_file"])
+        # net_info + candidates nạp một lần, kiểm tra tham chiếu chéo trước khi chạy
+        scenario = Scenario.load(cfg)
+        net_info, candidates = scenario.net_info, scenario.candidates
         logger.info("Loaded network information from: %s", cfg["sumo"]["net_info_file"])
-
-        candidates = _load(cfg["sumo"]["candidates_file"])["candidate_tls_ids"]
-        logger.info("Loaded candidate TLS IDs from: %s", cfg["sumo"]["candidates_file"])
+        logger.info("Loaded %d candidate TLS IDs from: %s", len(candidates), cfg["sumo"]["candidates_file"])
 
         # Lưu snapshot cấu hình
-        _save(os.path.join(run_dir, "config", "run_config_snapshot.json"), cfg)
+        if not args.resume:
+            _save(os.path.join(run_dir, "config", "run_config_snapshot.json"), cfg)
         logger.info("Setting up run directory: %s", run_dir.replace("\\", "/"))
 
         # Tạo thư mục cho pbil
@@ -94,108 +604,116 @@ def main():
         # Thiết lập PBIL & SUMO
         logger.info("Setting up PBIL and SUMO...")
         pbil_cfg = PBILConfig(**cfg["pbil"])
-        pbil = PBIL(pbil_cfg, candidates)
-        runner = SumoSimRunner(cfg["sumo"], cfg["controllers"], cfg["pbil"], net_info)
+        pbil = PBIL(pbil_cfg, candidates, net_info)
+        # Mỗi worker giữ một session SUMO, reset bằng traci.load giữa các cá thể
+        sumo_cfg = dict(cfg["sumo"])
+        sumo_cfg.setdefault("reuse_session", True)
+        runner = SumoSimRunner(sumo_cfg, cfg["controllers"], cfg["pbil"], net_info, scenario)
+
+        system = cfg.get("system", {})
+        use_broker = system.get("backend", "local") == "broker"
+
+        # Warm-start: mô phỏng warm-up một lần cho cả lần chạy (broker: mỗi worker tự làm)
+        if runner.warmup > 0 and not use_broker:
+            logger.info("Simulating warm-up (%.1fs) once for all individuals...", runner.warmup)
+            runner.prepare_warmup(os.path.join(run_dir, "warmup_state.xml"))
 
-        max_procs = cfg.get("system", {}).get("max_processes") or mp.cpu_count()
+        max_procs = system.get("max_processes") or mp.cpu_count()
         logger.info("Using up to %d parallel processes", max_procs)
 
-        # Cache lịch sử điểm (chia sẻ giữa tiến trình)
-        manager = mp.Manager()
-        data_history = [] # [{"config": [1,0,1], "score": 98.0, "res": {}}, ...]
-
-        best_hist = []
-        p_vec_history = [] # [[0.1,0.2],]
-
-        for g in range(pbil_cfg.Gmax):
-            logger.info("__________ Generation %d/%d: Starting __________", g + 1, pbil_cfg.Gmax)
-
-            pop = pbil.sample_population()
-
-            # Xóa những cá thể trùng lặp
-            pop = list(set(tuple(x.tolist()) for x in pop))  # unique
-
-            scores_list = manager.list()    # [{"config": [1,0,1], "score": 98.0, "res": {}}, ...]
-
-            # Tạo Pool với initializer để cấu hình logging cho từng worker
-            with mp.Pool(
-                processes=max_procs,
-                initializer=_pool_worker_init,
-                initargs=(log_queue,)
-            ) as pool:
-                async_results = []
-
-                for i, x in enumerate(pop):
-                    # Cache: nếu đã có trong lịch sử thì không đưa vào Pool
-                    for s in data_history:
-                        if s["config"] == x:
-                            scores_list.append(s)
-                            logger.debug("Process %d: %s -> Skipped (cached) -> Score: %.6f", i + 1, list(x), s["score"])
-                            break
-                        
-                    # Gửi job vào Pool
-                    logger.debug("Process %d: %s -> Starting...", i + 1, list(x))
-                    async_results.append(pool.apply_async(
-                        _run_simulation,
-                        args=(i, x, scores_list, candidates, runner, pbil)
-                    ))
-
-                logger.info("Waiting for %d process(es) to complete...", len(async_results))
-
-                # Chờ tất cả job hoàn thành (và lan truyền exception nếu có)
-                for r in async_results:
-                    r.wait()
-
-            # Thu kết quả quần thể
-            scores = list(scores_list)
-
-            # Best/Worst
-            best, worst = pick_best_worst(scores)
-            logger.info("Best:  %s -> Score: %.6f", list(best["config"]), best["score"])
-            logger.info("Worst: %s -> Score: %.6f", list(worst["config"]), worst["score"])
-
-            # Cập nhật vector xác suất
-            p_vec = pbil.update(np.array(best["config"]), np.array(worst["config"]))
-            logger.debug("Probability Vector: %s", p_vec)
-            logger.info("Updated Probability Vector.")
-
-            best_hist.append(best["score"])
-            p_vec_history.append(p_vec.tolist())
-
-            # Add to data_history
-            for s in scores:
-                data_history.append(
-                    {
-                        "gen": g,
-                        "config": list(s["config"]),
-                        "score": float(s["score"]),
-                        "res": s["res"]
-                    }
-                )
-
-            # Tìm cấu hình tốt nhất
-            best_score = min(data_history, key=lambda x: x["score"])["score"]
-            best_configs = {
-                "score": best_score,
-                "list_configs": [x for x in data_history if x["score"] == best_score]
-            }
-
-            # Lưu kết quả
-            _save(os.path.join(run_dir, "p_vec_history.json"), p_vec_history)
-            _save(os.path.join(run_dir, "data_history.json"), data_history)
-            _save(os.path.join(run_dir, "best_configs.json"), best_configs)
-
-            # Kiểm tra hội tụ
-            if pbil.converged(best_hist, eps=pbil_cfg.convergence_eps):
-                logger.info("STOP: Convergence reached (eps=%.6f).", pbil_cfg.convergence_eps)
-                break
+        # Score tốt nhất hiện tại, chia sẻ với worker để dừng sớm mô phỏng thua
+        incumbent = mp.Value("d", float("inf"))
+        if pbil_cfg.early_stop:
+            logger.info("Early stopping: bound=%s, margin=%.3f", pbil_cfg.early_stop_bound, pbil_cfg.early_stop_margin)
+            if pbil.objective.stop_metric is None:
+                logger.warning("Early stopping needs a mean-of-samples objective, ignored for %s.", pbil_cfg.evaluation)
+
+        fingerprint = scenario_fingerprint(cfg)
+        if use_broker:
+            # Job qua broker SQLite, worker (run-worker) trên một hoặc nhiều máy
+            broker_cfg = system.get("broker", {})
+            broker_path = broker_cfg.get("path", os.path.join("data", "results", "broker.sqlite"))
+            backend = BrokerBackend(broker_path, fingerprint, make_bundle(cfg, net_info, candidates), incumbent,
+                                    poll_interval=broker_cfg.get("poll_interval", 0.2),
+                                    job_timeout=broker_cfg.get("job_timeout", 3600.0),
+                                    warn_interval=broker_cfg.get("warn_interval", 60.0),
+                                    timeout=broker_cfg.get("timeout"))
+            logger.info("Evaluation backend: broker %s (start workers with run-worker --broker)", broker_path)
+        else:
+            # Một Pool duy nhất cho cả lần chạy (initializer gửi runner một lần/worker)
+            backend = LocalBackend(_run_simulation, max_procs, _pool_worker_init,
+                                   (log_queue, runner, incumbent, pbil, candidates))
+
+        # Cache điểm trên đĩa, dùng lại giữa các lần chạy cùng kịch bản
+        store_path = system.get("fitness_store", os.path.join("data", "results", "fitness_cache.sqlite"))
+        store = FitnessStore(store_path, fingerprint)
+        logger.info("Fitness store: %s (%d cached masks for this scenario)", store_path, len(store))
+
+        history = {
+            "data_history": [],   # [{"config": [1,0,1], "score": 98.0, "res": {}}, ...]
+            "best_hist": [],
+            "best_configs": None,
+        }
+
+        start_gen, n_done = 0, 0
+        ckpt = None
+        if args.resume:
+            ckpt = _restore(run_dir, pbil, history)
+            start_gen, n_done = ckpt["generation"] + 1, ckpt["n_evaluated"]
+            incumbent.value = min(history["best_hist"], default=float("inf"))
+            logger.info("Resuming at generation %d/%d (%d individual(s) already evaluated)",
+                        start_gen + 1, pbil_cfg.Gmax, n_done)
+            if pbil.converged(history["best_hist"], eps=pbil_cfg.convergence_eps):
+                logger.info("Run already converged, nothing to resume.")
+                start_gen, n_done = pbil_cfg.Gmax, pbil_cfg.Gmax * pbil_cfg.population
+
+        # Log kết quả chỉ ghi nối (resume: cắt về đúng vị trí của checkpoint)
+        log = ResultLog(run_dir, offsets=ckpt["log_offsets"] if ckpt else None)
+
+        if pbil_cfg.async_eval:
+            logger.info("Asynchronous evaluation: window=%d, max staleness=%d",
+                        pbil_cfg.window_size, pbil_cfg.max_staleness)
+            if pbil_cfg.surrogate:
+                logger.warning("Surrogate screening is only used in synchronous mode, ignored.")
+            if pbil_cfg.multi_fidelity:
+                logger.warning("Multi-fidelity evaluation is only used in synchronous mode, ignored.")
+            if pbil_cfg.replications > 1:
+                logger.warning("Replicated evaluation is only used in synchronous mode, ignored.")
+            best_configs = _run_async(backend, pbil, store, incumbent, max_procs, history, log,
+                                      start_gen=start_gen, n_done=n_done)
+        else:
+            if pbil_cfg.surrogate:
+                logger.info("Surrogate screening: %s simulation(s)/generation from %dx oversampling (after %d trained)",
+                            pbil_cfg.surrogate_n_eval or pbil_cfg.population, pbil_cfg.surrogate_oversample,
+                            pbil_cfg.surrogate_min_train)
+            if pbil_cfg.replications > 1:
+                logger.info("Replications: %d seed(s), up to %d for overlapping %.0f%% CIs",
+                            pbil_cfg.replications, pbil_cfg.replication_max, pbil_cfg.replication_confidence * 100)
+            if pbil_cfg.multi_fidelity:
+                logger.info("Multi-fidelity: screening end=%s, scale=%s, top-k=%s",
+                            pbil_cfg.fidelity_end, pbil_cfg.fidelity_scale,
+                            pbil_cfg.fidelity_schedule or pbil_cfg.fidelity_top_k)
+            best_configs = _run_generations(backend, pbil, store, incumbent, history, log,
+                                            start_gen=start_gen)
+
+        # Async: bỏ các job còn dở sau khi dừng
+        backend.close(cancel=pbil_cfg.async_eval)
+        store.close()
+        log.close()
+
+        # Resume một run đã xong: không còn thế hệ nào để chạy
+        if best_configs is None:
+            best_configs = history["best_configs"]
 
         # In kết quả gọn gàng
         logger.info("__________ RESULT __________")
-        logger.info("Best SCORE: %.6f", best_configs["score"])
-        for i, item in enumerate(best_configs["list_configs"]):
-            logger.info("Case %d: Gen %d: %s -> Number ATSC %d/%d",
-                        i + 1, item["gen"]+1, list(item["config"]), sum(item["config"]), len(item["config"]))
+        if best_configs is None:
+            logger.warning("No individual finished a full simulation, no best configuration.")
+        else:
+            logger.info("Best SCORE: %.6f", best_configs["score"])
+            for i, item in enumerate(best_configs["list_configs"]):
+                logger.info("Case %d: Gen %d: %s -> Number ATSC %d/%d",
+                            i + 1, item["gen"]+1, list(item["config"]), sum(item["config"]), len(item["config"]))
 
         logger.info("Results saved to: %s", run_dir)
         logger.info("========== Choose ATSC using PBIL Completed ==========")
@@ -203,6 +721,8 @@ def main():
     except FileNotFoundError as e:
         # Bắt lỗi thiếu file input, ghi đầy đủ traceback
         logging.getLogger(__name__).error("Missing file: %s", e, exc_info=True)
+    except ScenarioError as e:
+        logging.getLogger(__name__).error("%s", e)
     except Exception:
         logging.getLogger(__name__).error("Unhandled error in main()", exc_info=True)
     finally:
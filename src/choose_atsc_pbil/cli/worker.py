@@ -0,0 +1,119 @@
+# choose_atsc_pbil/cli/worker.py
+# Worker cho backend "broker": nhận job từ file broker SQLite và chạy mô phỏng.
+# Chạy trên mỗi máy (hoặc nhiều lần trên cùng một máy) trỏ tới cùng file broker.
+
+import argparse, os, time
+import logging
+import multiprocessing as mp
+
+from . import run_pbil
+from ..core.backends import BrokerIncumbent, JobBroker, incumbent_key, unpack_bundle, worker_name
+from ..core.pbil import PBIL, PBILConfig
+from ..sim.scenario import Scenario
+from ..sim.sim_runner import SumoSimRunner
+from ..utils.logger import setup_multiprocess_logging, worker_configurer
+
+
+def _prepare(broker: JobBroker, fingerprint: str, cache_dir: str) -> BrokerIncumbent:
+    """Giải nén kịch bản vào cache cục bộ, dựng runner/PBIL một lần cho mỗi fingerprint."""
+    logger = logging.getLogger(__name__)
+    bundle = broker.scenario(fingerprint)
+    if bundle is None:
+        raise RuntimeError(f"Scenario {fingerprint[:12]} not published on broker")
+
+    dest = os.path.join(cache_dir, fingerprint[:16])
+    cfg = unpack_bundle(bundle, dest)
+    logger.info("Scenario %s cached at: %s", fingerprint[:12], dest)
+
+    sumo_cfg = dict(cfg["sumo"])
+    sumo_cfg.setdefault("reuse_session", True)
+    scenario = Scenario(bundle["net_info"], bundle["candidates"], cfg["controllers"])
+    runner = SumoSimRunner(sumo_cfg, cfg["controllers"], cfg["pbil"], scenario.net_info, scenario)
+    if runner.warmup > 0:
+        # Mỗi process một file state riêng
+        runner.prepare_warmup(os.path.join(dest, f"warmup_state_{os.getpid()}.xml"))
+
+    pbil = PBIL(PBILConfig(**cfg["pbil"]), bundle["candidates"], bundle["net_info"])
+    incumbent = BrokerIncumbent(broker)
+    run_pbil._set_worker_state(runner, incumbent, pbil, bundle["candidates"])
+    return incumbent
+
+
+def _worker_loop(log_queue, broker_path: str, cache_dir: str, poll_interval: float, idle_exit: float):
+    worker_configurer(log_queue)
+    logger = logging.getLogger(__name__)
+
+    broker = JobBroker(broker_path)
+    name = worker_name()
+    current, incumbent = None, None
+    idle_since = time.monotonic()
+    n_done = 0
+    logger.info("Worker %s polling %s", name, broker_path)
+
+    while True:
+        job = broker.claim(name)
+        if job is None:
+            if idle_exit and time.monotonic() - idle_since > idle_exit:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        job_id, fingerprint, (run_id, task) = job
+        record = None
+        try:
+            if fingerprint != current:
+                incumbent = _prepare(broker, fingerprint, cache_dir)
+                current = fingerprint
+        except Exception:
+            logger.error("Job %d: failed to prepare scenario %s", job_id, fingerprint[:12], exc_info=True)
+            current = None
+        else:
+            # Ngưỡng dừng sớm: incumbent của đúng lần chạy đã gửi job
+            incumbent.use(incumbent_key(fingerprint, run_id))
+            try:
+                record = run_pbil._run_simulation(task)
+            except Exception:
+                logger.error("Job %d: simulation failed", job_id, exc_info=True)
+        broker.finish(job_id, record, failed=record is None)
+        n_done += 1
+        idle_since = time.monotonic()
+
+    logger.info("Worker %s idle for %.0fs, exiting after %d job(s)", name, idle_exit, n_done)
+    broker.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Worker đánh giá cá thể PBIL qua broker (system.backend = broker)")
+    ap.add_argument("--broker", required=True, help="File broker SQLite (system.broker.path của coordinator)")
+    ap.add_argument("--processes", type=int, default=None, help="Số process mô phỏng trên máy này")
+    ap.add_argument("--cache-dir", default=os.path.join("data", "results", "worker_cache"))
+    ap.add_argument("--poll-interval", type=float, default=0.5)
+    ap.add_argument("--idle-exit", type=float, default=0,
+                    help="Thoát sau số giây không có job (0: chạy mãi)")
+    args = ap.parse_args()
+
+    log_queue, listener = setup_multiprocess_logging(os.path.join(args.cache_dir, "logs"))
+    logger = logging.getLogger(__name__)
+    processes = args.processes or mp.cpu_count()
+    logger.info("========== Starting %d worker process(es) ==========", processes)
+
+    procs = []
+    try:
+        procs = [mp.Process(target=_worker_loop,
+                            args=(log_queue, args.broker, args.cache_dir, args.poll_interval, args.idle_exit))
+                 for _ in range(processes)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        logger.info("Interrupted, stopping workers...")
+        for p in procs:
+            p.terminate()
+    finally:
+        listener.stop()
+        logging.shutdown()
+
+
+if __name__ == "__main__":
+    main()
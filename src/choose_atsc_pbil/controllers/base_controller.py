@@ -7,6 +7,10 @@ from abc import ABC, abstractmethod
 class BaseController(ABC):
     """Mỗi TLS một instance controller."""
 
+    # False nếu controller không bao giờ cần gọi action() (vd. fixed_time);
+    # runner sẽ không đưa controller này vào hàng đợi sự kiện.
+    needs_action: bool = True
+
     def __init__(self, tls_id: str, iface, **params):
         self.tls_id = tls_id
         self.cfg = params
@@ -3,6 +3,8 @@ from . import register
 
 @register("fixed_time")
 class FixedTime(BaseController):
+    # SUMO tự chạy chương trình đèn, không cần callback
+    needs_action = False
 
     def start(self):
         pass
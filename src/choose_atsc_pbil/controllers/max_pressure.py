@@ -14,34 +14,62 @@ class MaxPressure(BaseController):
         self.tls_info = params.get("tls_info", {})
         self.sample_interval = params.get("sample_interval", 10.0)
         self.cycling = params.get("cycling", "linear")
+        # Số mẫu gần nhất dùng để tính occupancy trung bình; 0 -> trung bình theo từng chu kỳ
+        self.occupancy_window = int(params.get("occupancy_window", 0) or 0)
         self.cycle_time = self.tls_info["cycle"]
         self.phases = self.tls_info["phases"]
         self.edges = self.tls_info["edges"]
         self.movements = self.tls_info["movements"]
         self.lost_time = self._calculate_lost_time()
 
+        # Biên dịch tls_info thành ma trận một lần: pressure pha = K @ occupancy edge
+        self._edge_ids = list(self.edges)
+        self._phase_ids = list(self.phases)
+        self._pressure_kernel = self._compile_pressure_kernel()
+
     def start(self):
         # Initialize any necessary data structures or states
 
-        # init cache edge occupancy
-        self.cache_edges_occupancy = {}
-        for edge in self.edges:
-            self.cache_edges_occupancy[edge] = []
-
-    def _sample_action(self):
-        for edge, data in self.edges.items():
-            edge_occupancy = []
-            for detector in data["detector"]:
-                edge_occupancy.append(self.iface.get_lanearea_occupancy(detector))
-
-            # if edge have detector
-            if edge_occupancy:
-                self.cache_edges_occupancy[edge].append(np.mean(edge_occupancy))
-            # if edge has no detector
-            else:
-                self.cache_edges_occupancy[edge].append(np.float64(0))
-                # Print Warning
-                # print(f"Warning: No detector found for edge {edge}")
+        # Chỉ số detector của controller trong vector detector dùng chung của iface
+        # _det_avg[e, i] = 1/số detector của edge e nếu detector i thuộc edge e
+        # -> occupancy edge = _det_avg @ occupancy detector (edge không có detector -> 0)
+        n_edges = len(self._edge_ids)
+        det_ids, det_edge = [], []
+        for i, edge in enumerate(self._edge_ids):
+            for detector in self.edges[edge]["detector"]:
+                det_ids.append(detector)
+                det_edge.append(i)
+        self._det_idx = self.iface.detector_index(det_ids)
+        det_count = np.bincount(np.array(det_edge, dtype=np.intp), minlength=n_edges)
+        self._det_avg = np.zeros((n_edges, len(det_ids)))
+        for i, e in enumerate(det_edge):
+            self._det_avg[e, i] = 1.0 / det_count[e]
+
+        # Buffer cấp phát một lần, cập nhật tại chỗ mỗi lần lấy mẫu
+        self._det_buf = np.zeros(len(det_ids))
+        self._edge_buf = np.zeros(n_edges)
+        self._occ_mean = np.zeros(n_edges)
+        # Tổng cộng dồn + số mẫu; với sliding window thêm ring buffer các mẫu gần nhất
+        self._occ_sum = np.zeros(n_edges)
+        self._occ_count = 0
+        if self.occupancy_window > 0:
+            self._occ_ring = np.zeros((self.occupancy_window, n_edges))
+            self._ring_pos = 0
+
+    def _sample_action(self, t):
+        np.take(self.iface.read_detector_occupancy(t), self._det_idx, out=self._det_buf)
+        np.dot(self._det_avg, self._det_buf, out=self._edge_buf)
+
+        if self.occupancy_window > 0:
+            # Bỏ mẫu cũ nhất khỏi tổng, ghi đè bằng mẫu mới
+            slot = self._occ_ring[self._ring_pos]
+            self._occ_sum -= slot
+            slot[:] = self._edge_buf
+            self._ring_pos = (self._ring_pos + 1) % self.occupancy_window
+            self._occ_count = min(self._occ_count + 1, self.occupancy_window)
+        else:
+            self._occ_count += 1
+        self._occ_sum += self._edge_buf
 
     def _set_split(self, final_greentimes, splits):
         splits = self.iface.get_tls_splits(self.tls_id)
@@ -61,9 +89,10 @@ class MaxPressure(BaseController):
         self._set_split(final_greentimes, self.iface.get_tls_splits(self.tls_id))
         # print(f"Time: {self.iface.get_time()} - ID: {self.tls_id} -> MAX PRESSURE: SET CYCLE {final_greentimes}")
 
-        # reset cache
-        for edge in self.edges:
-            self.cache_edges_occupancy[edge] = []
+        # Trung bình theo chu kỳ: bắt đầu lại từ đầu; sliding window giữ nguyên buffer
+        if self.occupancy_window <= 0:
+            self._occ_sum.fill(0.0)
+            self._occ_count = 0
 
     def _calculate_lost_time(self):
         lost_time = 0
@@ -77,29 +106,45 @@ class MaxPressure(BaseController):
                 lost_time += phase.duration
         return lost_time
 
-    def _calculate_phases_pressure(self):
-        # calculate edges occupancy
-        edges_occupancy = {}
-        for edge in self.edges:
-            edges_occupancy[edge] = np.mean(self.cache_edges_occupancy[edge])
-
-        # calculate movements pressure
-        movements_pressure = {}
-        for from_edge, data in self.movements.items():
-            # Get sum out_edge by ratio
-            for out_edge, ratio in data.items():
-                out_pressure = edges_occupancy[out_edge] * ratio
-            movements_pressure[from_edge] = (edges_occupancy[from_edge] - out_pressure) * self.edges[from_edge]["sat_flow"]
-        
-        # calculate phases pressure
-        phases_pressure = {}
-        for phase, data in self.phases.items():
-            phase_pressure = 0
-            for movement in data["movements"]:
-                phase_pressure += movements_pressure.get(movement[0], 0) * self.movements[movement[0]][movement[1]]
-            phases_pressure[phase] = max(phase_pressure, 0)
+    def _compile_pressure_kernel(self) -> np.ndarray:
+        """
+        Ma trận K (số pha x số edge) sao cho pressure pha = max(K @ occupancy, 0).
+          - M (movement -> edge): M[f, from] = sat_flow(from),
+            M[f, to] -= ratio(from, to) * sat_flow(from)   (tổng theo mọi edge ra)
+          - P (pha -> movement): P[p, from] += ratio(from, to) với mỗi (from, to) xanh trong pha
+          - K = P @ M
+        """
+        edge_pos = {edge: i for i, edge in enumerate(self._edge_ids)}
+        from_ids = list(self.movements)
+        from_pos = {edge: i for i, edge in enumerate(from_ids)}
+
+        # movement pressure = (occ(from) - sum_to occ(to) * ratio) * sat_flow(from)
+        M = np.zeros((len(from_ids), len(self._edge_ids)))
+        for f, from_edge in enumerate(from_ids):
+            sat_flow = self.edges[from_edge]["sat_flow"]
+            M[f, edge_pos[from_edge]] += sat_flow
+            for out_edge, ratio in self.movements[from_edge].items():
+                M[f, edge_pos[out_edge]] -= ratio * sat_flow
+
+        # phase pressure = sum movement pressure * ratio của các movement xanh
+        P = np.zeros((len(self._phase_ids), len(from_ids)))
+        for p, phase in enumerate(self._phase_ids):
+            for from_edge, to_edge in self.phases[phase]["movements"]:
+                if from_edge in from_pos:
+                    P[p, from_pos[from_edge]] += self.movements[from_edge][to_edge]
+
+        return P @ M
+
+    def _edges_occupancy(self) -> np.ndarray:
+        if self._occ_count == 0:
+            self._occ_mean.fill(0.0)
+        else:
+            np.divide(self._occ_sum, self._occ_count, out=self._occ_mean)
+        return self._occ_mean
 
-        return phases_pressure
+    def _calculate_phases_pressure(self):
+        pressure = np.maximum(self._pressure_kernel @ self._edges_occupancy(), 0.0)
+        return dict(zip(self._phase_ids, pressure.tolist()))
 
     def _initialize_greentime(self, phases_pressure):
         """Initialize green time for each phase based on pressure - simplified."""
@@ -188,7 +233,7 @@ class MaxPressure(BaseController):
         # Perform action every sample interval
         if int(t) % int(self.sample_interval) == 0:
             # print(f"--- Sample for TLS ID {self.tls_id}")
-            self._sample_action()
+            self._sample_action(t)
 
         # Perform action every cycle time
         if int(t) % int(self.cycle_time) == 0:
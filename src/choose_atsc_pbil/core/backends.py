@@ -0,0 +1,371 @@
+import copy
+import logging
+import multiprocessing as mp
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from .fitness_store import SCENARIO_FILE_KEYS, scenario_files
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBackend:
+    """Đánh giá trên mp.Pool của máy hiện tại (mặc định)."""
+
+    def __init__(self, fn: Callable, processes: int, initializer=None, initargs=()):
+        self.fn = fn
+        self.pool = mp.Pool(processes=processes, initializer=initializer, initargs=initargs)
+
+    def map_unordered(self, tasks: List[tuple]) -> Iterator:
+        return self.pool.imap_unordered(self.fn, tasks)
+
+    def submit(self, task: tuple, callback: Callable, error_callback: Callable) -> None:
+        self.pool.apply_async(self.fn, args=(task,), callback=callback, error_callback=error_callback)
+
+    def close(self, cancel: bool = False) -> None:
+        # cancel: bỏ các job còn dở (async sau khi dừng)
+        if cancel:
+            self.pool.terminate()
+        else:
+            self.pool.close()
+        self.pool.join()
+
+
+class JobBroker:
+    """
+    Hàng đợi job trên một file SQLite dùng chung (ổ mạng hoặc cùng máy).
+    Coordinator ghi job + bundle kịch bản, worker trên các máy khác poll và nhận job.
+    Mỗi job mang fingerprint kịch bản để worker cache file kịch bản cục bộ.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Dùng chung giữa thread chính và thread poll của BrokerBackend (có khoá riêng)
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " fingerprint TEXT NOT NULL,"
+            " payload BLOB NOT NULL,"
+            " status TEXT NOT NULL,"          # queued | running | done | failed
+            " worker TEXT,"
+            " result BLOB,"
+            " created REAL NOT NULL,"
+            " started REAL,"
+            " finished REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS scenarios (fingerprint TEXT PRIMARY KEY, bundle BLOB NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value REAL)")
+
+    # --- phía coordinator ---
+    def publish_scenario(self, fingerprint: str, bundle: dict) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO scenarios (fingerprint, bundle) VALUES (?, ?)",
+                           (fingerprint, pickle.dumps(bundle)))
+
+    def enqueue(self, fingerprint: str, payloads: Iterable) -> List[int]:
+        now = time.time()
+        ids = []
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            for payload in payloads:
+                cur = self._conn.execute(
+                    "INSERT INTO jobs (fingerprint, payload, status, created) VALUES (?, ?, 'queued', ?)",
+                    (fingerprint, pickle.dumps(payload), now))
+                ids.append(cur.lastrowid)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return ids
+
+    def collect(self, ids: Iterable[int]) -> List[tuple]:
+        """(id, status, result) của các job đã xong trong ids; xoá chúng khỏi hàng đợi."""
+        ids = list(ids)
+        done = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT id, status, result FROM jobs WHERE id IN ({marks}) AND status IN ('done', 'failed')", chunk)
+            done.extend((job_id, status, pickle.loads(result) if result else None) for job_id, status, result in rows)
+        if done:
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id, _, _ in done])
+        return done
+
+    def requeue_stale(self, job_timeout: float) -> int:
+        """Đưa lại các job 'running' quá job_timeout (worker chết/mất kết nối) vào hàng đợi."""
+        cur = self._conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, started = NULL"
+            " WHERE status = 'running' AND started < ?", (time.time() - job_timeout,))
+        return cur.rowcount
+
+    def count_unclaimed(self, ids: Iterable[int], older_than: float) -> int:
+        """Số job trong ids vẫn 'queued' sau older_than giây (chưa worker nào nhận)."""
+        ids = list(ids)
+        cutoff = time.time() - older_than
+        n = 0
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            n += self._conn.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE id IN ({marks}) AND status = 'queued' AND created < ?",
+                chunk + [cutoff]).fetchone()[0]
+        return n
+
+    def cancel(self, ids: Iterable[int]) -> None:
+        self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in ids])
+
+    def set_state(self, key: str, value: float) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+    def reset(self) -> int:
+        """Xoá job và incumbent còn sót của coordinator trước (đã chết/đã dừng); trả về số job bị xoá."""
+        n = self._conn.execute("DELETE FROM jobs").rowcount
+        self._conn.execute("DELETE FROM state WHERE key LIKE 'incumbent:%'")
+        return n
+
+    # --- phía worker ---
+    def claim(self, worker: str) -> Optional[tuple]:
+        """Nhận job cũ nhất đang chờ: (id, fingerprint, payload) hoặc None."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT id, fingerprint, payload FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE jobs SET status = 'running', worker = ?, started = ? WHERE id = ?",
+                                   (worker, time.time(), row[0]))
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return row[0], row[1], pickle.loads(row[2])
+
+    def finish(self, job_id: int, result, failed: bool = False) -> None:
+        self._conn.execute("UPDATE jobs SET status = ?, result = ?, finished = ? WHERE id = ?",
+                           ("failed" if failed else "done", pickle.dumps(result), time.time(), job_id))
+
+    def scenario(self, fingerprint: str) -> Optional[dict]:
+        row = self._conn.execute("SELECT bundle FROM scenarios WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def get_state(self, key: str, default: float = None) -> Optional[float]:
+        row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def incumbent_key(fingerprint: str, run_id: str) -> str:
+    # Incumbent riêng cho từng lần chạy của từng kịch bản
+    return f"incumbent:{fingerprint}:{run_id}"
+
+
+class BrokerIncumbent:
+    """
+    Incumbent (score tốt nhất) đọc từ broker, phía worker; cache refresh giây để không query mỗi mẫu.
+    Worker gọi use(key) trước mỗi job để đọc đúng incumbent của lần chạy đã gửi job đó.
+    """
+
+    def __init__(self, broker: JobBroker, refresh: float = 1.0):
+        self.broker = broker
+        self.refresh = refresh
+        self.key = None
+        self._value = float("inf")
+        self._read_at = 0.0
+
+    def use(self, key: str) -> None:
+        if key != self.key:
+            self.key = key
+            self._value = float("inf")
+            self._read_at = 0.0
+
+    @property
+    def value(self) -> float:
+        if self.key is None:
+            return float("inf")
+        now = time.monotonic()
+        if now - self._read_at > self.refresh:
+            self._value = self.broker.get_state(self.key, float("inf"))
+            self._read_at = now
+        return self._value
+
+
+class BrokerBackend:
+    """
+    Đánh giá qua JobBroker: job được ghi vào SQLite, các worker (run-worker) trên
+    một hoặc nhiều máy nhận và chạy. Incumbent (mp.Value của coordinator) được đẩy
+    lên broker (khoá theo fingerprint + run_id) để worker dừng sớm như khi chạy cục bộ.
+    Mỗi file broker chỉ phục vụ một coordinator tại một thời điểm: khi khởi tạo, job
+    và incumbent còn sót của lần chạy trước bị xoá.
+    Job chưa worker nào nhận sau warn_interval giây được cảnh báo định kỳ (quên chạy
+    run-worker); timeout (giây, None = không giới hạn) giới hạn tổng thời gian chạy,
+    quá hạn thì huỷ job còn lại và báo TimeoutError.
+    """
+
+    def __init__(self, path: str, fingerprint: str, bundle: dict, incumbent=None,
+                 poll_interval: float = 0.2, job_timeout: float = 3600.0,
+                 warn_interval: float = 60.0, timeout: Optional[float] = None):
+        self.broker = JobBroker(path)
+        self.fingerprint = fingerprint
+        self.incumbent = incumbent
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.warn_interval = warn_interval
+        self.timeout = timeout
+        self._deadline = None if timeout is None else time.monotonic() + timeout
+        self._last_warn = time.monotonic()
+        self._timed_out = False
+        # run_id đi kèm mọi payload, worker đọc đúng incumbent của lần chạy này
+        self.run_id = uuid.uuid4().hex
+        self._incumbent_key = incumbent_key(fingerprint, self.run_id)
+
+        n_orphans = self.broker.reset()
+        if n_orphans:
+            logger.warning("Broker %s: discarded %d job(s) left by a previous coordinator", path, n_orphans)
+        self.broker.set_state(self._incumbent_key, float("inf"))
+        self.broker.publish_scenario(fingerprint, bundle)
+        self._last_incumbent = float("inf")
+
+        # Chế độ async: thread riêng chờ kết quả và gọi callback
+        self._pending = {}          # id -> (callback, error_callback)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._poller = None
+
+    def _push_incumbent(self) -> None:
+        if self.incumbent is None:
+            return
+        value = self.incumbent.value
+        if value != self._last_incumbent:
+            self.broker.set_state(self._incumbent_key, value)
+            self._last_incumbent = value
+
+    def _check_waiting(self, ids: List[int]) -> None:
+        """Cảnh báo job chưa được nhận (mỗi warn_interval giây); quá timeout thì huỷ và báo lỗi."""
+        now = time.monotonic()
+        if self._deadline is not None and now > self._deadline:
+            self.broker.cancel(ids)
+            self._timed_out = True
+            raise TimeoutError(f"Broker {self.broker.path}: {len(ids)} job(s) unfinished after {self.timeout:.0f}s")
+        if now - self._last_warn >= self.warn_interval:
+            self._last_warn = now
+            n = self.broker.count_unclaimed(ids, self.warn_interval)
+            if n:
+                logger.warning("Broker %s: %d/%d job(s) unclaimed for over %.0fs, is run-worker --broker running?",
+                               self.broker.path, n, len(ids), self.warn_interval)
+
+    def map_unordered(self, tasks: List[tuple]) -> Iterator:
+        self._push_incumbent()
+        with self._lock:
+            waiting = set(self.broker.enqueue(self.fingerprint, [(self.run_id, task) for task in tasks]))
+        while waiting:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                self._push_incumbent()
+                self.broker.requeue_stale(self.job_timeout)
+                done = self.broker.collect(waiting)
+                self._check_waiting(list(waiting - {job_id for job_id, _, _ in done}))
+            for job_id, status, result in done:
+                waiting.discard(job_id)
+                yield result if status == "done" else None
+
+    def submit(self, task: tuple, callback: Callable, error_callback: Callable) -> None:
+        if self._timed_out:
+            raise TimeoutError(f"Broker {self.broker.path}: timeout of {self.timeout:.0f}s reached")
+        with self._lock:
+            self._push_incumbent()
+            job_id = self.broker.enqueue(self.fingerprint, [(self.run_id, task)])[0]
+            self._pending[job_id] = (callback, error_callback)
+        if self._poller is None:
+            self._poller = threading.Thread(target=self._poll_loop, daemon=True)
+            self._poller.start()
+
+    def _poll_loop(self) -> None:
+        while not self._stop.is_set():
+            time.sleep(self.poll_interval)
+            with self._lock:
+                if not self._pending:
+                    continue
+                self._push_incumbent()
+                self.broker.requeue_stale(self.job_timeout)
+                done = self.broker.collect(list(self._pending))
+                callbacks = [(self._pending.pop(job_id), status, result) for job_id, status, result in done]
+                try:
+                    self._check_waiting(list(self._pending))
+                except TimeoutError as e:
+                    # Job còn lại đã bị huỷ: báo lỗi cho từng job, submit sau đó sẽ raise
+                    logger.error("%s", e)
+                    callbacks += [(cbs, "timeout", e) for cbs in self._pending.values()]
+                    self._pending.clear()
+            for (callback, error_callback), status, result in callbacks:
+                if status == "done":
+                    callback(result)
+                elif status == "timeout":
+                    error_callback(result)
+                else:
+                    error_callback(RuntimeError(f"Remote job failed: {result}"))
+
+    def close(self, cancel: bool = False) -> None:
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join()
+        with self._lock:
+            if cancel and self._pending:
+                self.broker.cancel(list(self._pending))
+            self._pending.clear()
+        self.broker.close()
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def make_bundle(cfg: dict, net_info: dict, candidates: dict) -> dict:
+    """
+    Gói kịch bản gửi cho worker: config, net_info, candidates và nội dung các file
+    đầu vào. Đường dẫn sumo.* được đổi thành tương đối với thư mục gốc chung.
+    """
+    paths = [p for p in scenario_files(cfg) if os.path.exists(p)]
+    root = os.path.commonpath([os.path.dirname(p) for p in paths])
+    files = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            files[os.path.relpath(path, root)] = f.read()
+
+    cfg = copy.deepcopy(cfg)
+    for key in SCENARIO_FILE_KEYS:
+        if cfg["sumo"].get(key):
+            cfg["sumo"][key] = os.path.relpath(os.path.abspath(cfg["sumo"][key]), root)
+    return {"cfg": cfg, "net_info": net_info, "candidates": candidates, "files": files}
+
+
+def unpack_bundle(bundle: dict, dest: str) -> dict:
+    """Ghi file kịch bản vào dest (bỏ qua nếu đã cache) và trả về config trỏ tới đó."""
+    for rel, content in bundle["files"].items():
+        path = os.path.join(dest, rel)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Nhiều process cùng máy có thể giải nén cùng lúc -> ghi file tạm rồi thay thế
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(content)
+            os.replace(tmp, path)
+
+    cfg = copy.deepcopy(bundle["cfg"])
+    for key in SCENARIO_FILE_KEYS:
+        if cfg["sumo"].get(key):
+            cfg["sumo"][key] = os.path.join(dest, cfg["sumo"][key])
+    return cfg
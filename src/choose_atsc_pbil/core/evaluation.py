@@ -2,3 +2,48 @@ import numpy as np
 
 def compute_avg_network_density(density_values):
     return float(np.mean(density_values)) if len(density_values) else 0.0
+
+
+def optimistic_mean_bound(total: float, n_seen: int, n_total: int, lower: float = 0.0) -> float:
+    """Giá trị mean nhỏ nhất có thể đạt được khi còn (n_total - n_seen) mẫu chưa thu, mỗi mẫu >= lower."""
+    n_total = max(n_total, n_seen, 1)
+    return (total + (n_total - n_seen) * lower) / n_total
+
+
+class EarlyStopper:
+    """
+    Điều kiện dừng sớm cho SumoSimRunner.run (score = mean của metric, càng nhỏ càng tốt).
+    Dừng khi cận dưới của score đã vượt ngưỡng threshold_fn().
+      - bound="optimistic": cận dưới chắc chắn (các mẫu còn lại >= lower)
+      - bound="partial": mean của các mẫu đã thu (nhanh hơn nhưng không chắc chắn)
+    Không dừng trước khi thu đủ min_fraction số mẫu.
+    """
+
+    def __init__(self, metric: str, n_total: int, threshold_fn, bound: str = "optimistic",
+                 min_fraction: float = 0.0, lower: float = 0.0):
+        if bound not in ("optimistic", "partial"):
+            raise ValueError("Early-stop bound not recognized. Use 'optimistic' or 'partial'.")
+        self.metric = metric
+        self.n_total = n_total
+        self.threshold_fn = threshold_fn
+        self.bound = bound
+        self.min_samples = int(min_fraction * n_total)
+        self.lower = lower
+        self._total = 0.0
+        self._seen = 0
+
+    def score_bound(self) -> float:
+        if self.bound == "partial":
+            return self._total / max(self._seen, 1)
+        return optimistic_mean_bound(self._total, self._seen, self.n_total, self.lower)
+
+    def __call__(self, collected_data: dict) -> bool:
+        samples = collected_data[self.metric]
+        # Cộng dồn các mẫu mới (tránh tính lại cả list mỗi lần)
+        for v in samples[self._seen:]:
+            self._total += float(v)
+        self._seen = len(samples)
+
+        if self._seen < self.min_samples:
+            return False
+        return self.score_bound() > self.threshold_fn()
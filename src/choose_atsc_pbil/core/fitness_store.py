@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from typing import Iterable, List, Optional
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _sumocfg_inputs(sumocfg: str) -> List[str]:
+    """Lấy net/route/additional files được khai báo trong .sumocfg (đường dẫn tuyệt đối)."""
+    base = os.path.dirname(os.path.abspath(sumocfg))
+    root = ET.parse(sumocfg).getroot()
+    files = []
+    for tag in ("net-file", "route-files", "additional-files"):
+        for el in root.iter(tag):
+            for name in el.attrib.get("value", "").split(","):
+                name = name.strip()
+                if name:
+                    files.append(os.path.normpath(os.path.join(base, name)))
+    return files
+
+
+# Các khoá sumo.* trỏ tới file đầu vào của kịch bản
+SCENARIO_FILE_KEYS = ("sumocfg", "net_file", "rou_file", "detectors_file", "net_info_file", "add_file")
+
+
+def scenario_files(cfg: dict) -> List[str]:
+    """File đầu vào của kịch bản: các khoá sumo.* + file khai báo trong sumocfg (tuyệt đối, đã sắp xếp)."""
+    sumo = cfg["sumo"]
+    paths = set()
+    for key in SCENARIO_FILE_KEYS:
+        if sumo.get(key):
+            paths.add(os.path.normpath(os.path.abspath(sumo[key])))
+    paths.update(_sumocfg_inputs(sumo["sumocfg"]))
+    return sorted(paths)
+
+
+def _candidate_ids(cfg: dict) -> List[str]:
+    """ID các TLS candidate theo đúng thứ tự trong candidates_file (bit i của mask <-> TLS thứ i)."""
+    path = cfg["sumo"].get("candidates_file")
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return list(json.load(f)["candidate_tls_ids"])
+
+
+def scenario_fingerprint(cfg: dict) -> str:
+    """
+    Hash của kịch bản: nội dung sumocfg + net/route/additional/net-info,
+    danh sách TLS candidate (có thứ tự), tham số controller và các tham số
+    mô phỏng ảnh hưởng tới score.
+    Hai lần chạy có cùng fingerprint thì cùng một mask cho cùng một score.
+    """
+    sumo = cfg["sumo"]
+    h = hashlib.sha256()
+    for path in scenario_files(cfg):
+        if os.path.exists(path):
+            h.update(os.path.basename(path).encode())
+            h.update(_file_hash(path).encode())
+
+    params = {
+        # Tăng khi metric/controller đổi cách tính (score cũ không còn dùng được)
+        # 2: average_occupancy bỏ internal edge; 3: sửa out_pressure của MaxPressure
+        # 4: mẫu metric lưu float32
+        "metrics_version": 4,
+        # Sửa/đổi thứ tự candidate -> cùng chuỗi bit trỏ tới TLS khác
+        # (p khởi tạo trong file không ảnh hưởng score nên không hash)
+        "candidates": _candidate_ids(cfg),
+        "controllers": cfg.get("controllers", {}),
+        "begin": sumo.get("begin", 0),
+        "end": sumo.get("end"),
+        "warmup": sumo.get("warmup", 0),
+        "step_length": sumo.get("step_length"),
+        "lateral_resolution": sumo.get("lateral_resolution"),
+        "sample_interval": cfg.get("pbil", {}).get("sample_interval"),
+        "evaluation": cfg.get("pbil", {}).get("evaluation"),
+    }
+    # Score là mean qua nhiều seed -> khác cache của lần chạy một seed
+    pbil = cfg.get("pbil", {})
+    if pbil.get("replications", 1) > 1:
+        params["replication_seeds"] = pbil.get("replication_seeds") or list(range(pbil.get("replication_max", 5)))
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+class FitnessStore:
+    """
+    Cache điểm của từng mask trên đĩa (SQLite), khoá = hash(mask + fingerprint kịch bản).
+    Các bản ghi của fingerprint hiện tại được nạp lên dict để tra O(1).
+    """
+
+    def __init__(self, path: str, fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fitness ("
+            " key TEXT PRIMARY KEY,"
+            " fingerprint TEXT NOT NULL,"
+            " config TEXT NOT NULL,"
+            " score REAL NOT NULL,"
+            " res TEXT NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_fitness_fp ON fitness (fingerprint)")
+        self._conn.commit()
+
+        self._mem = {}
+        rows = self._conn.execute(
+            "SELECT key, score, res FROM fitness WHERE fingerprint = ?", (fingerprint,)
+        )
+        for key, score, res in rows:
+            self._mem[key] = {"score": score, "res": json.loads(res)}
+
+    def __len__(self):
+        return len(self._mem)
+
+    def key(self, x: Iterable[int]) -> str:
+        bits = "".join("1" if xi else "0" for xi in x)
+        return hashlib.sha256(f"{self.fingerprint}:{bits}".encode()).hexdigest()
+
+    def get(self, x: Iterable[int]) -> Optional[dict]:
+        rec = self._mem.get(self.key(x))
+        if rec is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {"config": [int(xi) for xi in x], "score": rec["score"], "res": dict(rec["res"])}
+
+    def put(self, x: Iterable[int], score: float, res: dict):
+        x = [int(xi) for xi in x]
+        key = self.key(x)
+        self._mem[key] = {"score": float(score), "res": res}
+        self._conn.execute(
+            "INSERT OR REPLACE INTO fitness (key, fingerprint, config, score, res, created) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, self.fingerprint, json.dumps(x), float(score), json.dumps(res), time.time()),
+        )
+        self._conn.commit()
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,161 @@
+# src/core/objectives.py
+# Hàm mục tiêu của PBIL: score(res, mask) -> float, càng nhỏ càng tốt
+from typing import Dict, List, Optional, Type
+
+import numpy as np
+
+from ..sim.collectors import COLLECTORS
+
+
+def _series(res: dict, metric: str) -> np.ndarray:
+    """Giá trị theo từng xe nếu collector có (vd. travel time), ngược lại chuỗi mẫu (float32 -> cộng dồn float64)."""
+    if COLLECTORS[metric].per_vehicle and f"{metric}_values" in res:
+        return np.asarray(res[f"{metric}_values"], dtype=np.float64)
+    return np.asarray(res.get(metric, ()), dtype=np.float64)
+
+
+class BaseObjective:
+    """
+    Một hàm mục tiêu. metrics(): các collector cần chạy trong mô phỏng.
+    stop_metric: metric mà score là mean theo mẫu (dùng được cho EarlyStopper), None nếu không.
+    """
+    stop_metric: Optional[str] = None
+
+    def __init__(self, net_info: Optional[dict] = None):
+        pass
+
+    def metrics(self) -> List[str]:
+        return []
+
+    def score(self, res: dict, mask: Optional[Dict[str, bool]] = None) -> float:
+        raise NotImplementedError
+
+
+OBJECTIVES: Dict[str, Type[BaseObjective]] = {}
+
+def register(name: str):
+    def deco(cls):
+        OBJECTIVES[name] = cls
+        return cls
+    return deco
+
+def build(spec, net_info: Optional[dict] = None) -> BaseObjective:
+    """
+    spec là tên metric (giữ cách cấu hình cũ: mean của metric đó) hoặc
+    dict {"name": <objective>, ...params}.
+    """
+    if isinstance(spec, str):
+        spec = {"name": "mean", "metric": spec}
+    params = dict(spec)
+    name = params.pop("name")
+    if name not in OBJECTIVES:
+        raise KeyError(f"Unknown objective: {name}")
+    return OBJECTIVES[name](net_info=net_info, **params)
+
+
+class _MetricObjective(BaseObjective):
+    def __init__(self, metric: str, maximize: bool = False, net_info: Optional[dict] = None):
+        super().__init__(net_info)
+        if metric not in COLLECTORS:
+            raise KeyError(f"Unknown collector: {metric}")
+        self.metric = metric
+        # Metric càng lớn càng tốt (vd. throughput) -> đổi dấu
+        self.sign = -1.0 if maximize else 1.0
+
+    def metrics(self) -> List[str]:
+        return [self.metric]
+
+
+@register("mean")
+class Mean(_MetricObjective):
+    def __init__(self, metric: str, maximize: bool = False, net_info: Optional[dict] = None):
+        super().__init__(metric, maximize, net_info)
+        if not maximize and not COLLECTORS[metric].per_vehicle:
+            self.stop_metric = metric
+
+    def score(self, res, mask=None) -> float:
+        values = _series(res, self.metric)
+        return self.sign * float(values.mean()) if values.size else 0.0
+
+
+@register("percentile")
+class Percentile(_MetricObjective):
+    def __init__(self, metric: str, q: float = 95.0, maximize: bool = False, net_info: Optional[dict] = None):
+        super().__init__(metric, maximize, net_info)
+        self.q = q
+
+    def score(self, res, mask=None) -> float:
+        values = _series(res, self.metric)
+        return self.sign * float(np.percentile(values, self.q)) if values.size else 0.0
+
+
+@register("total")
+class Total(_MetricObjective):
+    # Tổng cả horizon (vd. {"name": "total", "metric": "throughput", "maximize": true})
+    def score(self, res, mask=None) -> float:
+        return self.sign * float(np.asarray(res.get(self.metric, ()), dtype=np.float64).sum())
+
+
+@register("atsc_cost")
+class AtscCost(BaseObjective):
+    """
+    Chi phí triển khai các nút bật ATSC. costs: theo tls_id hoặc theo tên
+    controller của nút (net_info["tls"][tls]["controller"]); còn lại dùng default.
+    """
+
+    def __init__(self, costs: Optional[Dict[str, float]] = None, default: float = 1.0,
+                 net_info: Optional[dict] = None):
+        super().__init__(net_info)
+        self.costs = costs or {}
+        self.default = default
+        # Chỉ giữ tls_id -> tên controller (objective được gửi sang mọi worker)
+        self.controller_of = {tls_id: info.get("controller")
+                              for tls_id, info in (net_info or {}).get("tls", {}).items()}
+
+    def _cost(self, tls_id: str) -> float:
+        if tls_id in self.costs:
+            return self.costs[tls_id]
+        return self.costs.get(self.controller_of.get(tls_id), self.default)
+
+    def score(self, res, mask=None) -> float:
+        return float(sum(self._cost(tls_id) for tls_id, on in (mask or {}).items() if on))
+
+
+class _Combination(BaseObjective):
+    def __init__(self, terms: list, net_info: Optional[dict] = None):
+        super().__init__(net_info)
+        if not terms:
+            raise ValueError("Objective combination needs at least one term.")
+        self.terms = []
+        self.weights = []
+        for term in terms:
+            term = {"name": "mean", "metric": term} if isinstance(term, str) else dict(term)
+            self.weights.append(float(term.pop("weight", 1.0)))
+            self.terms.append(build(term, net_info))
+
+    def metrics(self) -> List[str]:
+        return list(dict.fromkeys(m for t in self.terms for m in t.metrics()))
+
+
+@register("weighted")
+class Weighted(_Combination):
+    # Tổng có trọng số: {"name": "weighted", "terms": [{"name": "mean", "metric": ..., "weight": 1.0}, ...]}
+    def score(self, res, mask=None) -> float:
+        return float(sum(w * t.score(res, mask) for w, t in zip(self.weights, self.terms)))
+
+
+@register("tie_break")
+class TieBreak(_Combination):
+    """
+    Tổng có trọng số eps^i: score = sum(eps^i * term_i). Các term sau chủ yếu để
+    phân định khi term đầu (gần) bằng nhau, nhưng KHÔNG phải thứ tự từ điển: nếu
+    eps * (biên độ term sau) lớn hơn chênh lệch của term trước thì term sau vẫn
+    lấn át. Chọn eps theo thang đo của các term.
+    """
+
+    def __init__(self, terms: list, eps: float = 1e-6, net_info: Optional[dict] = None):
+        super().__init__(terms, net_info)
+        self.eps = eps
+
+    def score(self, res, mask=None) -> float:
+        return float(sum(self.eps ** i * t.score(res, mask) for i, t in enumerate(self.terms)))
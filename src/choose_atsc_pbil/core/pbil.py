@@ -1,7 +1,10 @@
 from __future__ import annotations
 import numpy as np
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from .selection import pick_best_worst
+from .objectives import build as build_objective
 
 @dataclass
 class PBILConfig:
@@ -33,22 +36,75 @@ class PBILConfig:
     # When trimming to satisfy N_max: probability of choosing exploitation vs exploration
     exploit_prob: float = 0.5
 
-    # Evaluation
-    evaluation: str = "total_vehicle"
+    # Evaluation: tên metric (mean) hoặc objective {"name": ..., ...} (xem core/objectives.py)
+    evaluation: Union[str, dict] = "total_vehicle"
 
     # Random seed
     random_seed: Optional[int] = None
 
+    # Asynchronous (steady-state) evaluation
+    async_eval: bool = False                # Cập nhật p theo cửa sổ cá thể đã chạy xong
+    window_size: int = 10                   # Số cá thể hoàn thành cho mỗi lần cập nhật
+    max_staleness: int = 2                  # Bỏ cá thể được sinh từ p cũ hơn N lần cập nhật
+
+    # Racing - dừng sớm mô phỏng chắc chắn thua incumbent
+    early_stop: bool = False
+    early_stop_margin: float = 0.05         # Ngưỡng = incumbent * (1 + margin)
+    early_stop_bound: str = "optimistic"    # "optimistic" (chắc chắn) hoặc "partial" (mean hiện tại)
+    early_stop_min_fraction: float = 0.2    # Thu tối thiểu tỷ lệ mẫu này trước khi được dừng
+
+    # Surrogate - lọc trước cá thể bằng mô hình hồi quy học từ data_history
+    surrogate: bool = False
+    surrogate_n_eval: Optional[int] = None  # Số mô phỏng thật mỗi thế hệ (None = population)
+    surrogate_oversample: int = 3           # Sinh population * oversample cá thể để chọn
+    surrogate_min_train: int = 30           # Số cá thể đã mô phỏng tối thiểu trước khi dùng surrogate
+    surrogate_alpha: float = 1.0            # Hệ số ridge
+    surrogate_interactions: bool = False    # Thêm đặc trưng cặp bit x_i * x_j
+    surrogate_explore: float = 0.25         # Tỷ lệ suất mô phỏng dành cho cá thể bất định nhất
+
+    # Multi-fidelity - sàng lọc cả quần thể bằng mô phỏng rẻ, chỉ top-k chạy đầy đủ
+    multi_fidelity: bool = False
+    fidelity_end: Optional[float] = None    # Horizon ngắn khi sàng lọc (None = sumo.end)
+    fidelity_scale: Optional[float] = None  # Hệ số demand khi sàng lọc (SUMO --scale)
+    fidelity_top_k: int = 5                 # Số cá thể được chạy đầy đủ mỗi thế hệ
+    fidelity_schedule: Optional[List[int]] = None  # top_k theo thế hệ (giá trị cuối lặp lại)
+
+    # Lưu chuỗi thời gian metric của từng cá thể (một file .npz mỗi thế hệ)
+    save_timeseries: bool = False
+
+    # Replication - chạy mỗi mask với nhiều seed SUMO (cùng bộ seed cho mọi mask)
+    replications: int = 1                   # Số seed chạy ban đầu (1 = tắt)
+    replication_max: int = 5                # Số seed tối đa cho một mask
+    replication_confidence: float = 0.95    # Mức tin cậy của khoảng tin cậy score
+    replication_seeds: Optional[List[int]] = None  # Bộ seed dùng chung (None = 0..replication_max-1)
+
 class PBIL:
-    def __init__(self, cfg: PBILConfig, candidates: dict):
+    def __init__(self, cfg: PBILConfig, candidates: dict, net_info: Optional[dict] = None):
         self.C = len(candidates)
         self.candidates = candidates
         self.cfg = cfg
         self.rng = np.random.default_rng(self.cfg.random_seed)
+        self.objective = build_objective(cfg.evaluation, net_info)
 
         # initialize probability vector
         self.p = self._init_prob()
 
+        # Số lần p đã được cập nhật (dùng để đo độ "cũ" của cá thể ở chế độ async)
+        self.version = 0
+
+    def get_state(self) -> dict:
+        """Trạng thái cần để chạy tiếp (JSON được): p, số lần cập nhật, trạng thái RNG."""
+        return {
+            "p": self.p.tolist(),
+            "version": self.version,
+            "rng_state": self.rng.bit_generator.state,
+        }
+
+    def set_state(self, state: dict) -> None:
+        self.p = np.array(state["p"], dtype=float)
+        self.version = int(state.get("version", 0))
+        self.rng.bit_generator.state = state["rng_state"]
+
     def _init_prob(self):
         # Generator vector
         p = np.array(list(self.candidates.values()), dtype=float)
@@ -77,19 +133,25 @@ class PBIL:
         x2[drop_idx] = 0
         return x2
 
-    def sample_population(self, p: Optional[np.ndarray] = None) -> np.ndarray:
+    def sample_population(self, p: Optional[np.ndarray] = None, size: Optional[int] = None) -> np.ndarray:
         p = self.p if p is None else p
+        size = self.cfg.population if size is None else size
         # Bernoulli sampling
-        X = (self.rng.random((self.cfg.population, self.C)) < p).astype(np.uint8)
+        X = (self.rng.random((size, self.C)) < p).astype(np.uint8)
         # Enforce N_max per individual
         if self.cfg.N_max is not None:
             for i in range(X.shape[0]):
                 X[i] = self._trim_to_N_max(X[i], p)
         return X
 
+    def sample_one(self) -> np.ndarray:
+        """Sinh một cá thể từ p hiện tại (dùng cho chế độ async)."""
+        x = (self.rng.random(self.C) < self.p).astype(np.uint8)
+        return self._trim_to_N_max(x, self.p)
+
     # Calculate score
-    def calculate_score(self, res):
-        return np.mean(res.get(self.cfg.evaluation, 0))
+    def calculate_score(self, res, mask: Optional[Dict[str, bool]] = None) -> float:
+        return self.objective.score(res, mask)
 
     def update(self, best, worst: Optional[np.ndarray] = None):
         p = self.p
@@ -115,8 +177,25 @@ class PBIL:
 
         # Lưu lại xác suất mới update
         self.p = np.clip(p, self.cfg.prob_min, self.cfg.prob_max)
+        self.version += 1
         return self.p
 
+    def update_window(self, window: List[dict]):
+        """
+        Cập nhật p từ một cửa sổ cá thể đã hoàn thành (chế độ async).
+        Mỗi phần tử: {"config": [...], "score": float, "version": int}.
+        Cá thể sinh từ p cũ hơn max_staleness lần cập nhật bị bỏ qua.
+        Trả về (best, worst) hoặc None nếu không còn cá thể hợp lệ chạy xong (không dừng sớm).
+        """
+        fresh = [s for s in window if self.version - s.get("version", self.version) <= self.cfg.max_staleness]
+        if not fresh:
+            return None
+        best, worst = pick_best_worst(fresh)
+        if best is None:
+            return None
+        self.update(np.array(best["config"]), np.array(worst["config"]))
+        return best, worst
+
     def converged(self, best_score_hist: List[float], eps: Optional[float] = None):
         eps = self.cfg.convergence_eps if eps is None else eps
         if len(best_score_hist) < 2:
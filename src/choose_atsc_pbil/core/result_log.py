@@ -0,0 +1,125 @@
+import json
+import os
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+INDIVIDUALS_FILE = "individuals.jsonl"
+GENERATIONS_FILE = "generations.jsonl"
+TIMESERIES_DIR = "timeseries"
+
+
+class ResultLog:
+    """
+    Log kết quả chỉ ghi nối (JSON Lines) của một lần chạy PBIL:
+    - individuals.jsonl: một dòng cho mỗi cá thể đã đánh giá
+    - generations.jsonl: một dòng cho mỗi lần cập nhật p
+    - timeseries/gen_XXXX.npz (tuỳ chọn): chuỗi metric của các cá thể đã mô phỏng
+    Chi phí ghi mỗi thế hệ không phụ thuộc độ dài lần chạy.
+    """
+
+    def __init__(self, run_dir: str, offsets: Optional[Dict[str, int]] = None):
+        """offsets: vị trí lưu trong checkpoint khi resume; None = lần chạy mới, xoá log cũ trong run_dir."""
+        self.run_dir = run_dir
+        os.makedirs(run_dir, exist_ok=True)
+        self._files = {}
+        for name, fname in (("individuals", INDIVIDUALS_FILE), ("generations", GENERATIONS_FILE)):
+            # Lần chạy mới ghi vào --output đã có: không trộn bản ghi với lần chạy trước
+            f = open(os.path.join(run_dir, fname), "wb" if offsets is None else "ab")
+            # Resume: cắt bỏ các dòng ghi sau checkpoint
+            if offsets is not None:
+                f.truncate(offsets.get(name, 0))
+                f.seek(0, os.SEEK_END)
+            self._files[name] = f
+
+        ts_dir = os.path.join(run_dir, TIMESERIES_DIR)
+        if offsets is None and os.path.isdir(ts_dir):
+            for fname in os.listdir(ts_dir):
+                if fname.startswith("gen_") and fname.endswith(".npz"):
+                    os.remove(os.path.join(ts_dir, fname))
+
+    def _write(self, name: str, record: dict) -> None:
+        self._files[name].write(json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n")
+
+    def write_individual(self, record: dict) -> None:
+        self._write("individuals", record)
+
+    def write_generation(self, record: dict) -> None:
+        self._write("generations", record)
+
+    def write_timeseries(self, gen: int, records: List[dict]) -> None:
+        """
+        Gom "series" ({metric: float32[n]}) của các record có mô phỏng thành
+        ma trận (cá thể x mẫu) float32, chuỗi ngắn hơn (dừng sớm, fidelity thấp)
+        được đệm NaN. Kèm ma trận config (uint8) theo cùng thứ tự hàng.
+        """
+        records = [r for r in records if r.get("series")]
+        if not records:
+            return
+        arrays = {"config": np.array([r["config"] for r in records], dtype=np.uint8)}
+        for name in records[0]["series"]:
+            n = max(len(r["series"].get(name, ())) for r in records)
+            mat = np.full((len(records), n), np.nan, dtype=np.float32)
+            for i, r in enumerate(records):
+                v = r["series"].get(name, ())
+                mat[i, :len(v)] = v
+            arrays[name] = mat
+
+        path = os.path.join(self.run_dir, TIMESERIES_DIR, f"gen_{gen:04d}.npz")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, **arrays)
+
+    def flush(self) -> None:
+        for f in self._files.values():
+            f.flush()
+
+    def offsets(self) -> Dict[str, int]:
+        """Vị trí cuối mỗi file (sau flush), lưu vào checkpoint để resume."""
+        self.flush()
+        return {name: f.tell() for name, f in self._files.items()}
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+
+
+def iter_records(path: str) -> Iterator[dict]:
+    """Đọc lười từng dòng; bỏ dòng cuối bị ghi dở (process bị kill)."""
+    with open(path, "rb") as f:
+        for line in f:
+            if line.endswith(b"\n") and line.strip():
+                yield json.loads(line)
+
+
+def read_individuals(run_dir: str, gen: Optional[int] = None) -> Iterator[dict]:
+    for rec in iter_records(os.path.join(run_dir, INDIVIDUALS_FILE)):
+        if gen is None or rec["gen"] == gen:
+            yield rec
+
+
+def read_generations(run_dir: str) -> Iterator[dict]:
+    return iter_records(os.path.join(run_dir, GENERATIONS_FILE))
+
+
+def load_columns(run_dir: str) -> Dict[str, np.ndarray]:
+    """
+    Các cột gọn cho vẽ biểu đồ: gen, score (NaN nếu chỉ có score sàng lọc),
+    n_on (số ATSC bật) và early_stopped. Không giữ config/res trong bộ nhớ.
+    """
+    gen, score, n_on, stopped = [], [], [], []
+    for rec in read_individuals(run_dir):
+        gen.append(rec["gen"])
+        score.append(np.nan if rec["score"] is None else rec["score"])
+        n_on.append(sum(rec["config"]))
+        stopped.append(rec.get("early_stopped", False))
+    return {
+        "gen": np.array(gen, dtype=np.int32),
+        "score": np.array(score, dtype=float),
+        "n_on": np.array(n_on, dtype=np.int32),
+        "early_stopped": np.array(stopped, dtype=bool),
+    }
+
+
+def load_timeseries(run_dir: str, gen: int):
+    """NpzFile của một thế hệ: mỗi mảng ("config", metric...) chỉ được đọc khi truy cập."""
+    return np.load(os.path.join(run_dir, TIMESERIES_DIR, f"gen_{gen:04d}.npz"))
@@ -1,7 +1,12 @@
 import numpy as np
 
 def pick_best_worst(scores):
+    # Mọi mô phỏng đều lỗi -> không có best/worst
+    if not scores:
+        return None, None
     by = sorted(scores, key=lambda x: x["score"])
-    best = by[0]
+    # Cá thể dừng sớm chỉ có cận dưới của score: không được làm best, vẫn có thể là worst
+    finished = [s for s in by if not s.get("early_stopped")]
+    best = finished[0] if finished else None
     worst = by[-1]
     return best, worst
@@ -0,0 +1,94 @@
+import numpy as np
+from typing import List, Optional, Tuple
+
+
+class RidgeSurrogate:
+    """
+    Mô hình thay thế (surrogate) dự đoán score từ bit-vector cấu hình.
+    Ridge regression trên bit (và tuỳ chọn các cặp bit x_i * x_j), có thêm
+    độ bất định kiểu Bayesian: std(x) = sqrt(sigma2 * (1 + phi^T A^-1 phi)).
+    """
+
+    def __init__(self, alpha: float = 1.0, interactions: bool = False):
+        self.alpha = alpha
+        self.interactions = interactions
+        self.coef_: Optional[np.ndarray] = None
+        self._A_inv: Optional[np.ndarray] = None
+        self._y_mean = 0.0
+        self._y_scale = 1.0
+        self._sigma2 = 1.0
+
+    def _features(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X[None, :]
+        cols = [np.ones((X.shape[0], 1)), X]
+        if self.interactions:
+            i, j = np.triu_indices(X.shape[1], k=1)
+            cols.append(X[:, i] * X[:, j])
+        return np.hstack(cols)
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> "RidgeSurrogate":
+        y = np.asarray(y, dtype=float)
+        # Chuẩn hoá y để alpha không phụ thuộc thang đo của metric
+        self._y_mean = float(y.mean())
+        self._y_scale = float(y.std()) or 1.0
+        z = (y - self._y_mean) / self._y_scale
+
+        Phi = self._features(X)
+        A = Phi.T @ Phi + self.alpha * np.eye(Phi.shape[1])
+        A[0, 0] -= self.alpha       # không phạt hệ số chặn
+        A[0, 0] += 1e-9
+        self._A_inv = np.linalg.inv(A)
+        self.coef_ = self._A_inv @ (Phi.T @ z)
+
+        resid = z - Phi @ self.coef_
+        dof = max(len(z) - 1, 1)
+        self._sigma2 = max(float(resid @ resid) / dof, 1e-12)
+        return self
+
+    def predict(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Trả về (mean, std) của score dự đoán cho từng hàng của X."""
+        if self.coef_ is None:
+            raise RuntimeError("Surrogate is not fitted.")
+        Phi = self._features(X)
+        mean = Phi @ self.coef_
+        var = self._sigma2 * (1.0 + np.einsum("ij,jk,ik->i", Phi, self._A_inv, Phi))
+        return mean * self._y_scale + self._y_mean, np.sqrt(var) * self._y_scale
+
+
+def training_data(data_history: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (X, y) từ data_history, bỏ các cá thể dừng sớm (score chỉ là cận dưới)
+    và các cá thể chỉ có score fidelity thấp (score = None).
+    """
+    seen = {}
+    for s in data_history:
+        if s.get("early_stopped") or s["score"] is None:
+            continue
+        seen[tuple(s["config"])] = s["score"]
+    if not seen:
+        return np.zeros((0, 0)), np.zeros(0)
+    X = np.array(list(seen.keys()), dtype=float)
+    y = np.array(list(seen.values()), dtype=float)
+    return X, y
+
+
+def screen(surrogate: RidgeSurrogate, pop: List[tuple], n_eval: int, explore: float = 0.0) -> List[tuple]:
+    """
+    Chọn n_eval cá thể từ pop để mô phỏng thật (score càng nhỏ càng tốt):
+      - (1 - explore) phần: mean dự đoán nhỏ nhất
+      - explore phần còn lại: độ bất định (std) lớn nhất trong số chưa chọn
+    """
+    if len(pop) <= n_eval:
+        return list(pop)
+    mean, std = surrogate.predict(np.array(pop, dtype=float))
+
+    n_explore = int(round(explore * n_eval))
+    n_exploit = n_eval - n_explore
+    chosen = list(np.argsort(mean, kind="stable")[:n_exploit])
+
+    if n_explore > 0:
+        rest = np.setdiff1d(np.arange(len(pop)), chosen)
+        chosen += list(rest[np.argsort(-std[rest], kind="stable")[:n_explore]])
+    return [pop[i] for i in chosen]
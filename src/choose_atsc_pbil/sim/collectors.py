@@ -0,0 +1,106 @@
+# src/sim/collectors.py
+# Metric thu tại mỗi lần lấy mẫu của SumoSimRunner (mỗi metric -> một chuỗi trong kết quả)
+from typing import Dict, Optional, Type
+
+import numpy as np
+
+
+class BaseCollector:
+    """
+    Một metric mạng lưới. setup() gọi một lần sau khi SUMO start/load.
+    Collector per_vehicle còn trả về values() (một giá trị mỗi xe) khi kết thúc,
+    lưu trong kết quả với khoá "<tên>_values".
+    """
+    per_vehicle = False
+
+    def __init__(self, iface):
+        self.iface = iface
+
+    def setup(self) -> None:
+        pass
+
+    def collect(self) -> float:
+        raise NotImplementedError
+
+    def values(self) -> Optional[np.ndarray]:
+        return None
+
+
+COLLECTORS: Dict[str, Type[BaseCollector]] = {}
+
+def register(name: str):
+    def deco(cls):
+        COLLECTORS[name] = cls
+        return cls
+    return deco
+
+def build(name: str, iface) -> BaseCollector:
+    if name not in COLLECTORS:
+        raise KeyError(f"Unknown collector: {name}")
+    return COLLECTORS[name](iface)
+
+
+@register("total_vehicle")
+class TotalVehicle(BaseCollector):
+    def collect(self) -> float:
+        return self.iface.get_total_vehicle()
+
+
+@register("average_occupancy")
+class AverageOccupancy(BaseCollector):
+    # Occupancy trung bình của các edge thường, đọc qua subscription
+    def setup(self) -> None:
+        self.iface.subscribe_edges()
+
+    def collect(self) -> float:
+        occupancy = self.iface.read_edge_occupancy()
+        return float(occupancy.mean()) if occupancy.size else 0.0
+
+
+@register("waiting_time")
+class WaitingTime(BaseCollector):
+    # Tổng thời gian chờ (giây) của mọi xe trên các edge thường
+    def setup(self) -> None:
+        self.iface.subscribe_edges(["VAR_WAITING_TIME"])
+
+    def collect(self) -> float:
+        return float(self.iface.read_edges("VAR_WAITING_TIME").sum())
+
+
+@register("queue_length")
+class QueueLength(BaseCollector):
+    # Số xe đang dừng (tốc độ < 0.1 m/s) trên các edge thường
+    def setup(self) -> None:
+        self.iface.subscribe_edges(["LAST_STEP_VEHICLE_HALTING_NUMBER"])
+
+    def collect(self) -> float:
+        return float(self.iface.read_edges("LAST_STEP_VEHICLE_HALTING_NUMBER").sum())
+
+
+@register("throughput")
+class Throughput(BaseCollector):
+    # Số xe rời mạng kể từ mẫu trước
+    def setup(self) -> None:
+        self.iface.track_arrivals()
+
+    def collect(self) -> float:
+        return float(len(self.iface.read_arrivals()))
+
+
+@register("travel_time")
+class TravelTime(BaseCollector):
+    # Mẫu: travel time trung bình của xe rời mạng kể từ mẫu trước (0 nếu không có xe)
+    # values(): travel time của từng xe đã rời mạng
+    per_vehicle = True
+
+    def setup(self) -> None:
+        self.iface.track_arrivals()
+        self._values = []
+
+    def collect(self) -> float:
+        arrived = self.iface.read_arrivals()
+        self._values.append(arrived)
+        return float(arrived.mean()) if arrived.size else 0.0
+
+    def values(self) -> np.ndarray:
+        return np.concatenate(self._values).astype(np.float32) if self._values else np.zeros(0, dtype=np.float32)
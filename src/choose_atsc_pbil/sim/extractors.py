@@ -1,7 +1,7 @@
 import json
 import networkx as nx
-import sumolib
-from xml.etree import ElementTree as ET
+
+from .net_index import load_net_index
 
 # def sumo_net_to_nx_graph():
 #     """Minimal extractor scaffold: creates an empty directed graph.
@@ -16,62 +16,26 @@ from xml.etree import ElementTree as ET
 #     return out_json
 
 def sumo_net_to_nx_graph(net_file: str, out_json: str):
-    net = sumolib.net.readNet(net_file)
+    # Edges, connections (gom theo tl) và tlLogic từ một lần iterparse (có cache)
+    index = load_net_index(net_file)
     G = nx.DiGraph()  # Đồ thị có hướng (directed)
 
-    for edge in net.getEdges():
-        edge_id = edge.getID()
-        from_node = edge.getFromNode().getID()
-        to_node = edge.getToNode().getID()
-        length = edge.getLength()
-        lanes = [lane.getID() for lane in edge.getLanes()]
-
-    # Thêm cạnh vào đồ thị với các thuộc tính
-        G.add_edge(from_node, to_node,
+    for edge_id, edge in index["edges"].items():
+        # Thêm cạnh vào đồ thị với các thuộc tính
+        G.add_edge(edge["from"], edge["to"],
                    id=edge_id,
-                   length=length,
-                   lanes=lanes)
+                   length=edge["length"],
+                   lanes=edge["lanes"])
 
     # Add traffic lights (TLS) to the graph
-    tree = ET.parse(net_file)
-    root = tree.getroot()
-    
-    for tls in root.findall("tlLogic"):
-        tls_id = tls.attrib.get("id")
-        phases = []
-        phase_durations = []
-
-        for i, phase in enumerate(tls.findall("phase")):
-            duration = phase.attrib.get("duration")
-            state = phase.attrib.get("state")
-            phase_durations.append(float(duration))
-            phases.append(state)
-            
-            # print(f"  Phase {i+1}: duration = {duration}, state = {state}")
-        
-        # Add connection information
-        connections = []
-        for conn in root.findall("connection"):
-            if conn.attrib.get("tl") == tls_id:
-                link_index = int(conn.attrib.get("linkIndex"))
-                from_edge = conn.attrib.get("from")
-                to_edge = conn.attrib.get("to")
-                from_lane = conn.attrib.get("fromLane")
-                to_lane = conn.attrib.get("toLane")
-                turn_ratio = conn.attrib.get("turnRatio", "0.2")  # Default to 0.2 if not specified
-                connections.append({
-                    "link_index": link_index,
-                    "from_edge": from_edge,
-                    "to_edge": to_edge,
-                    "from_lane": from_lane,
-                    "to_lane": to_lane,
-                    "turn_ratio": float(turn_ratio)
-                })
-        # sort connections by link_index
-        connections.sort(key=lambda x: x["link_index"])
-
-        # Add turn ratio information
-        # Change this part if you have turn ratios in your XML
+    for tls_id, tls in index["tls"].items():
+        phases = [ph["state"] for ph in tls["phases"]]
+        phase_durations = [ph["duration"] for ph in tls["phases"]]
+
+        # Add connection information (đã sort theo link_index)
+        # Default turn ratio 0.2 if not specified
+        connections = [dict(c, turn_ratio=c.get("turn_ratio", 0.2))
+                       for c in index["connections"].get(tls_id, [])]
 
         G.add_node(tls_id, phases=phases, phase_durations=phase_durations, connections=connections)
 
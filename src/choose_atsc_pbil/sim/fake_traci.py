@@ -0,0 +1,260 @@
+# src/sim/fake_traci.py
+# Backend giả lập API traci/libsumo (phần TraciIF dùng) để chạy benchmark/thử nghiệm không cần SUMO.
+# Mạng lấy từ net_info (TLS, edge, detector); xe và occupancy sinh ngẫu nhiên có seed.
+import json
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+constants = SimpleNamespace(
+    LAST_STEP_OCCUPANCY=0x13,
+    LAST_STEP_VEHICLE_HALTING_NUMBER=0x14,
+    VAR_WAITING_TIME=0x7a,
+    VAR_LAST_INTERVAL_OCCUPANCY=0x23,
+)
+
+# Xe vào mạng (xe/giây) và xác suất một xe rời mạng mỗi giây
+ARRIVAL_RATE = 0.5
+EXIT_RATE = 0.01
+YELLOW = 3.0
+
+_net_info: dict = {"tls": {}}
+_world = None
+
+
+def configure(net_info_file: Optional[str] = None, net_info: Optional[dict] = None) -> None:
+    """Chọn mạng cho các lần start/load sau (TraciIF gọi với sumo.net_info_file)."""
+    global _net_info
+    if net_info is None and net_info_file:
+        with open(net_info_file, "r", encoding="utf-8") as f:
+            net_info = json.load(f)
+    _net_info = net_info or {"tls": {}}
+
+
+class _Phase:
+    def __init__(self, state: str, duration: float):
+        self.state = state
+        self.duration = duration
+
+
+class _Logic:
+    def __init__(self, phases: List[_Phase]):
+        self.phases = phases
+
+
+class _World:
+    def __init__(self, args: List[str]):
+        opts = {args[i]: args[i + 1] for i in range(len(args) - 1) if args[i].startswith("-")}
+        self.step_length = float(opts.get("--step-length", 1.0))
+        self.rng = np.random.default_rng(int(opts.get("--seed", 23423)))
+        self.time = float(opts.get("--begin", 0.0))
+
+        self.tls = {}
+        self.edges = []
+        self.detectors = []
+        for tls_id, info in _net_info.get("tls", {}).items():
+            n = max((int(p) for p in info.get("phases", {})), default=0) + 1
+            phases = [_Phase("G", float(info["phases"][str(i)]["duration"])) if str(i) in info["phases"]
+                      else _Phase("y", YELLOW) for i in range(n)]
+            self.tls[tls_id] = _Logic(phases)
+            for edge_id, edge in info.get("edges", {}).items():
+                self.edges.append(edge_id)
+                self.detectors.extend(edge.get("detector", []))
+        self.edges = list(dict.fromkeys(self.edges)) or ["e0"]
+        self.detectors = list(dict.fromkeys(self.detectors))
+        self.edge_occ = np.zeros(len(self.edges))
+        self.det_occ = np.zeros(len(self.detectors))
+
+        self.vehicles: Dict[str, float] = {}   # id -> thời điểm xuất phát
+        self.n_departed = 0
+        # Xe vào / rời mạng trong bước vừa chạy (getDepartedIDList / getArrivedIDList)
+        self.departed: List[str] = []
+        self.arrived: List[str] = []
+        self.edge_subs = {}
+        self.det_subs = {}
+
+    def advance(self, t: float) -> None:
+        dt = max(t - self.time, 0.0)
+        if dt <= 0:
+            return
+        # Xe rời mạng / vào mạng trong khoảng dt
+        self.arrived, self.departed = [], []
+        if self.vehicles:
+            gone = self.rng.random(len(self.vehicles)) < 1.0 - (1.0 - EXIT_RATE) ** dt
+            for vid, g in zip(list(self.vehicles), gone):
+                if g:
+                    del self.vehicles[vid]
+                    self.arrived.append(vid)
+        for _ in range(self.rng.poisson(ARRIVAL_RATE * dt)):
+            vid = f"veh{self.n_departed}"
+            self.vehicles[vid] = self.time + self.rng.random() * dt
+            self.departed.append(vid)
+            self.n_departed += 1
+        self.edge_occ = self.rng.random(len(self.edges)) * min(len(self.vehicles) / 10.0, 100.0)
+        self.det_occ = self.rng.random(len(self.detectors)) * 100.0
+        self.time = t
+
+
+def _w() -> _World:
+    if _world is None:
+        raise RuntimeError("fake_traci: simulation not started")
+    return _world
+
+
+def start(cmd: List[str], **kwargs) -> None:
+    global _world
+    _world = _World(list(cmd[1:]))
+
+
+def load(args: List[str]) -> None:
+    global _world
+    _world = _World(list(args))
+
+
+def close(wait: bool = True) -> None:
+    global _world
+    _world = None
+
+
+def simulationStep(step: float = 0.0) -> None:
+    w = _w()
+    w.advance(step if step > 0 else w.time + w.step_length)
+
+
+class simulation:
+    @staticmethod
+    def getTime() -> float:
+        return _w().time
+
+    @staticmethod
+    def getMinExpectedNumber() -> int:
+        return len(_w().vehicles)
+
+    @staticmethod
+    def getDepartedIDList() -> List[str]:
+        return list(_w().departed)
+
+    @staticmethod
+    def getArrivedIDList() -> List[str]:
+        return list(_w().arrived)
+
+    @staticmethod
+    def saveState(path: str) -> None:
+        w = _w()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"time": w.time, "vehicles": w.vehicles, "n_departed": w.n_departed}, f)
+
+    @staticmethod
+    def loadState(path: str) -> None:
+        w = _w()
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        w.time = state["time"]
+        w.vehicles = dict(state["vehicles"])
+        w.n_departed = state["n_departed"]
+
+
+class vehicle:
+    @staticmethod
+    def getIDCount() -> int:
+        return len(_w().vehicles)
+
+    @staticmethod
+    def getIDList() -> List[str]:
+        return list(_w().vehicles)
+
+    @staticmethod
+    def getDeparture(vid: str) -> float:
+        return _w().vehicles[vid]
+
+
+class trafficlight:
+    @staticmethod
+    def getIDList() -> List[str]:
+        return list(_w().tls)
+
+    @staticmethod
+    def getPhase(tls_id: str) -> int:
+        return 0
+
+    @staticmethod
+    def setPhase(tls_id: str, index: int) -> None:
+        pass
+
+    @staticmethod
+    def setPhaseDuration(tls_id: str, duration: float) -> None:
+        pass
+
+    @staticmethod
+    def getPhaseDuration(tls_id: str) -> float:
+        return _w().tls[tls_id].phases[0].duration
+
+    @staticmethod
+    def getNextSwitch(tls_id: str) -> float:
+        return _w().time + _w().tls[tls_id].phases[0].duration
+
+    @staticmethod
+    def getCompleteRedYellowGreenDefinition(tls_id: str) -> List[_Logic]:
+        logic = _w().tls[tls_id]
+        return [_Logic([_Phase(p.state, p.duration) for p in logic.phases])]
+
+    @staticmethod
+    def setCompleteRedYellowGreenDefinition(tls_id: str, logic: _Logic) -> None:
+        _w().tls[tls_id] = logic
+
+    @staticmethod
+    def getControlledLanes(tls_id: str) -> List[str]:
+        return []
+
+    @staticmethod
+    def getControlledLinks(tls_id: str) -> list:
+        return []
+
+
+class edge:
+    @staticmethod
+    def getIDList() -> List[str]:
+        return list(_w().edges)
+
+    @staticmethod
+    def subscribe(edge_id: str, var_ids: List[int]) -> None:
+        _w().edge_subs[edge_id] = list(var_ids)
+
+    @staticmethod
+    def getAllSubscriptionResults() -> dict:
+        w = _w()
+        index = {e: i for i, e in enumerate(w.edges)}
+        return {e: {var: float(w.edge_occ[index[e]]) for var in vars_} for e, vars_ in w.edge_subs.items()}
+
+    @staticmethod
+    def getLastStepOccupancy(edge_id: str) -> float:
+        w = _w()
+        return float(w.edge_occ[w.edges.index(edge_id)])
+
+
+class lanearea:
+    @staticmethod
+    def getIDList() -> List[str]:
+        return list(_w().detectors)
+
+    @staticmethod
+    def subscribe(det_id: str, var_ids: List[int]) -> None:
+        _w().det_subs[det_id] = list(var_ids)
+
+    @staticmethod
+    def getAllSubscriptionResults() -> dict:
+        w = _w()
+        index = {d: i for i, d in enumerate(w.detectors)}
+        return {d: {var: float(w.det_occ[index[d]]) for var in vars_} for d, vars_ in w.det_subs.items()}
+
+    @staticmethod
+    def getLastIntervalOccupancy(det_id: str) -> float:
+        w = _w()
+        return float(w.det_occ[w.detectors.index(det_id)])
+
+
+class lane:
+    @staticmethod
+    def getIDList() -> List[str]:
+        return []
@@ -0,0 +1,140 @@
+# choose_atsc_pbil/sim/net_index.py
+"""
+Chỉ mục của SUMO .net.xml dựng trong một lần iterparse: edges, connections gom theo
+tl và phases của từng tlLogic. Mỗi phần tử con trực tiếp của <net> được xoá ngay sau
+khi đọc nên bộ nhớ chỉ tỉ lệ với chỉ mục, không với cây DOM.
+
+Chỉ mục được cache (pickle) theo hash nội dung file net, build-net-info và
+build-tls-candidates chạy lại trên cùng net sẽ không phải parse lại.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPEED = 13.89  # m/s, ~50 km/h nếu không thấy speed
+DEFAULT_CACHE_DIR = os.path.join("data", "processed", "net_index")
+# Tăng khi đổi cấu trúc chỉ mục -> cache cũ tự bị bỏ qua
+INDEX_VERSION = 1
+
+
+def _edge(elem: ET.Element) -> dict:
+    lanes = elem.findall("lane")
+    # Lane đầu tiên (thường các lane cùng length/speed)
+    first = lanes[0].attrib if lanes else {}
+    return {
+        "from": elem.get("from"),
+        "to": elem.get("to"),
+        "length": float(first.get("length", "0.0")),
+        "speed": float(first.get("speed", str(DEFAULT_SPEED))),
+        "lanes": [lane.get("id") for lane in lanes],
+    }
+
+
+def _connection(elem: ET.Element) -> dict:
+    rec = {
+        "link_index": int(elem.get("linkIndex", "-1")),
+        "from_edge": elem.get("from"),
+        "to_edge": elem.get("to"),
+        "from_lane": elem.get("fromLane"),
+        "to_lane": elem.get("toLane"),
+    }
+    # SUMO có thể không có turnRatio — nếu có thì giữ lại
+    if "turnRatio" in elem.attrib:
+        try:
+            rec["turn_ratio"] = float(elem.attrib["turnRatio"])
+        except ValueError:
+            pass
+    return rec
+
+
+def _tl_logic(elem: ET.Element) -> dict:
+    phases = [{"index": i, "duration": float(ph.get("duration", "0")), "state": ph.get("state", "")}
+              for i, ph in enumerate(elem.findall("phase"))]
+    return {
+        "type": elem.get("type"),
+        "program_id": elem.get("programID"),
+        "offset": elem.get("offset"),
+        "phases": phases,
+        "cycle": sum(ph["duration"] for ph in phases),
+    }
+
+
+def parse_net(net_file: str) -> dict:
+    """
+    Một lần iterparse toàn bộ net:
+      {"edges": {edge_id: {from, to, length, speed, lanes}}     (bỏ internal edge ":...")
+       "connections": {tl_id: [{link_index, from_edge, to_edge, from_lane, to_lane, turn_ratio?}]}
+                       (đã sort theo link_index)
+       "tls": {tls_id: {type, program_id, offset, phases, cycle}}  (theo thứ tự trong file)}
+    """
+    edges, tls = {}, {}
+    connections = defaultdict(list)
+
+    context = ET.iterparse(net_file, events=("start", "end"))
+    _, root = next(context)
+    depth = 1
+    for event, elem in context:
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+
+        # Con trực tiếp của <net> đã đọc xong
+        if elem.tag == "edge":
+            edge_id = elem.get("id")
+            if edge_id and not edge_id.startswith(":"):
+                edges[edge_id] = _edge(elem)
+        elif elem.tag == "connection":
+            tl = elem.get("tl")
+            if tl:
+                connections[tl].append(_connection(elem))
+        elif elem.tag == "tlLogic":
+            tls_id = elem.get("id")
+            if tls_id:
+                tls[tls_id] = _tl_logic(elem)
+        root.clear()
+
+    for lst in connections.values():
+        lst.sort(key=lambda c: c["link_index"])
+    return {"edges": edges, "connections": dict(connections), "tls": tls}
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_net_index(net_file: str, cache_dir: str = DEFAULT_CACHE_DIR) -> dict:
+    """Chỉ mục của net_file, đọc từ cache nếu đã parse net có cùng nội dung (cache_dir=None: không cache)."""
+    if cache_dir is None:
+        return parse_net(net_file)
+
+    path = os.path.join(cache_dir, f"{file_hash(net_file)[:32]}.v{INDEX_VERSION}.pkl")
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                index = pickle.load(f)
+            logger.info("Loaded net index from cache: %s", path)
+            return index
+        except (OSError, pickle.UnpicklingError, EOFError):
+            logger.warning("Net index cache unreadable, re-parsing: %s", path)
+
+    index = parse_net(net_file)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    logger.info("Parsed %s (%d edges, %d TLS), index cached at: %s",
+                net_file, len(index["edges"]), len(index["tls"]), path)
+    return index
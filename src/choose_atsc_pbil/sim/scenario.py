@@ -0,0 +1,90 @@
+# choose_atsc_pbil/sim/scenario.py
+"""
+Scenario: net_info + candidate TLS + controller plan của một kịch bản.
+  - Nạp file một lần mỗi process (cache theo đường dẫn + mtime)
+  - Kiểm tra tham chiếu chéo ngay khi nạp (candidate có trong net_info, controller có trong plan/registry)
+  - Tính sẵn (tên controller, params) cho từng TLS, SumoSimRunner không phải tra dict lồng nhau mỗi lần chạy
+Là object Python thuần, pickle một lần mỗi worker (initializer của Pool) là đủ.
+"""
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from ..controllers import REGISTRY as CONTROLLERS
+
+# (net_info_file, mtime, candidates_file, mtime, controller plan) -> Scenario
+_CACHE: Dict[tuple, "Scenario"] = {}
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ScenarioError(ValueError):
+    """net_info / candidates / controller plan không khớp nhau."""
+
+
+class Scenario:
+    def __init__(self, net_info: dict, candidates: Optional[dict], controller_plan: dict):
+        self.net_info = net_info
+        self.tls = net_info.get("tls", {})
+        # {tls_id: p khởi tạo} như tls-candidates.json
+        self.candidates = dict(candidates or {})
+        self.controller_plan = controller_plan
+        self.validate()
+
+        default = controller_plan["default"]
+        self.default_spec: Tuple[str, dict] = (default["name"], dict(default.get("params", {})))
+        # Spec adaptive theo TLS, params đã có tls_info của nút (TLS có controller không có trong plan: bỏ qua,
+        # chỉ lỗi nếu thực sự được bật adaptive)
+        self.adaptive_specs: Dict[str, Tuple[str, dict]] = {}
+        for tls_id, info in self.tls.items():
+            spec = controller_plan.get(info.get("controller"))
+            if spec is not None:
+                params = dict(spec.get("params", {}))
+                params.setdefault("tls_info", info)
+                self.adaptive_specs[tls_id] = (spec["name"], params)
+
+    @classmethod
+    def load(cls, cfg: dict, with_candidates: bool = True) -> "Scenario":
+        """Scenario của cfg (sumo.net_info_file, sumo.candidates_file, controllers), cache trong process."""
+        sumo = cfg["sumo"]
+        net_info_file = sumo["net_info_file"]
+        candidates_file = sumo.get("candidates_file") if with_candidates else None
+        key = (os.path.abspath(net_info_file), os.path.getmtime(net_info_file),
+               candidates_file and os.path.abspath(candidates_file),
+               candidates_file and os.path.getmtime(candidates_file),
+               json.dumps(cfg["controllers"], sort_keys=True))
+        if key not in _CACHE:
+            candidates = _load(candidates_file)["candidate_tls_ids"] if candidates_file else {}
+            _CACHE[key] = cls(_load(net_info_file), candidates, cfg["controllers"])
+        return _CACHE[key]
+
+    def validate(self) -> None:
+        """Kiểm tra tham chiếu chéo, gom mọi lỗi vào một ScenarioError."""
+        errors: List[str] = []
+        plan = self.controller_plan
+        if "default" not in plan:
+            errors.append('controller plan has no "default" entry')
+        for key, spec in plan.items():
+            if spec.get("name") not in CONTROLLERS:
+                errors.append(f"controllers.{key}: unknown controller {spec.get('name')!r}")
+
+        for tls_id in self.candidates:
+            info = self.tls.get(tls_id)
+            if info is None:
+                errors.append(f"candidate TLS {tls_id!r} not found in net_info['tls']")
+            elif info.get("controller") not in plan:
+                errors.append(f"TLS {tls_id!r}: controller {info.get('controller')!r} not in controller plan")
+
+        if errors:
+            raise ScenarioError("Invalid scenario:\n  " + "\n  ".join(errors))
+
+    def controller_spec(self, tls_id: str, adaptive: bool) -> Tuple[str, dict]:
+        """(tên controller, params) cho TLS: spec adaptive đã tính sẵn hoặc default."""
+        if not adaptive:
+            return self.default_spec
+        if tls_id not in self.adaptive_specs:
+            raise ScenarioError(f"TLS {tls_id!r} has no adaptive controller in net_info/controller plan")
+        return self.adaptive_specs[tls_id]
@@ -1,132 +1,146 @@
-import time, json, os, random
+import time, json, os, random, heapq
 from datetime import datetime
-from typing import Dict
+from typing import Callable, Dict, List, Optional
 import numpy as np
 
 from .traci_interface import TraciIF
+from .collectors import build as build_collector
+from .scenario import Scenario
+from .sumo_outputs import parse_outputs
 from ..controllers import build as build_controller
+from ..core.objectives import build as build_objective
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Loại sự kiện trong heap (cùng thời điểm: controller chạy trước khi lấy mẫu)
+_EVENT_ACTION = 0
+_EVENT_SAMPLE = 1
+
 class SumoSimRunner:
-    def __init__(self, sumo_cfg: dict, controller_plan: dict, pbil_cfg: dict, net_info: dict):
+    # Metric thu mặc định khi không có objective (xem sim/collectors.py)
+    DEFAULT_COLLECTORS = ["total_vehicle", "average_occupancy"]
+
+    def __init__(self, sumo_cfg: dict, controller_plan: dict, pbil_cfg: dict, net_info: dict,
+                 scenario: Optional[Scenario] = None):
         self.sumo_cfg = sumo_cfg
         self.controller_plan = controller_plan
         self.pbil_cfg = pbil_cfg
         self.net_info = net_info
+        # Scenario đã nạp/kiểm tra (Scenario.load) dùng lại được; không có thì dựng từ net_info
+        self.scenario = scenario or Scenario(net_info, None, controller_plan)
         self.iface = TraciIF(sumo_cfg)
         self.controllers = {}
 
-    # Collect data
-    def _collect_data(self, collected_data):
-        # Collect Total Vehicle
-        collected_data["total_vehicle"].append(self.iface.get_total_vehicle())
-
-        # Collect Average Occupancy
-        edges = self.iface.get_list_edge()
-        total_occupancy = 0
-        for edge in edges:
-            total_occupancy += self.iface.get_edge_occupancy(edge)
-
-        average_occupancy = total_occupancy / len(edges) if edges else 0
-        collected_data["average_occupancy"].append(average_occupancy)
-
-
-        return collected_data
-
-    def _controller_for(self, tls_id: str, adaptive_mask: dict):
-        # For Adaptive
-        if adaptive_mask.get(tls_id):
-            # spec = self.controller_plan[adaptive_mask.get(tls_id)]
-            spec = self.controller_plan[self.net_info["tls"][tls_id]["controller"]]
-            params = dict(spec.get("params", {}))
-
-            # Bơm tls_info từ net vào cho Adaptive
-            tls_info = self.net_info["tls"][tls_id]
-            params.setdefault("tls_info", tls_info)
-            return build_controller(spec["name"], tls_id, self.iface, **params)
-        
-        # For default
-        spec = self.controller_plan["default"]
-        params = dict(spec.get("params", {}))
-        return build_controller(spec["name"], tls_id, self.iface, **params)
-
-    def run(self, adaptive_mask: Dict[str,bool]) -> dict:
-
-        # Init collected data
-        collected_data = {
-            "total_vehicle": [],
-            "average_occupancy": []
-        }
-
-        self.iface.start()
+        # Chỉ thu các metric objective cần (+ sumo.collectors nếu muốn ghi thêm)
+        if pbil_cfg.get("evaluation") is None:
+            needed = list(self.DEFAULT_COLLECTORS)
+        else:
+            needed = build_objective(pbil_cfg["evaluation"], net_info).metrics()
+        self.collectors = list(dict.fromkeys(needed + list(sumo_cfg.get("collectors", []))))
+
+        # Warm-start: đoạn warm-up (toàn bộ fixed_time) chỉ mô phỏng một lần
+        self.warmup = float(sumo_cfg.get("warmup", 0) or 0)
+        self._warmup_state = None
+        self._warmup_data = None
+        self._warmup_end = None
+
+    @staticmethod
+    def _next_sampling(t: float, sample_interval: float) -> float:
+        return (int(t) // int(sample_interval) + 1) * sample_interval
+
+    def _init_events(self, tls_ids, t: float, sample_interval: float):
+        """
+        Heap sự kiện (thời điểm, loại, chỉ số controller). Controller không cần
+        action() (vd. fixed_time) không vào heap, nên chi phí vòng lặp tỉ lệ với số
+        nút thích nghi chứ không phải kích thước mạng. Lấy mẫu là một sự kiện riêng.
+        """
+        active = [tls_id for tls_id in tls_ids if self.controllers[tls_id].needs_action]
+        events = [(t, _EVENT_ACTION, i) for i in range(len(active))]
+        events.append((self._next_sampling(t, sample_interval), _EVENT_SAMPLE, -1))
+        heapq.heapify(events)
+        return active, events
+
+    @staticmethod
+    def _pop_due(events, t: float):
+        """Lấy mọi sự kiện tại thời điểm t (controller trước, lấy mẫu sau)."""
+        due = []
+        while events and events[0][0] == t:
+            _, kind, i = heapq.heappop(events)
+            due.append((kind, i))
+        return due
+
+    def prepare_warmup(self, state_file: str) -> None:
+        """Mô phỏng warm-up một lần với toàn bộ TLS fixed_time và lưu state.
+        Các lần run() sau sẽ loadState từ điểm này thay vì chạy lại từ begin."""
+        if self.warmup <= 0:
+            return
+
+        warmup_end = min(self.iface.begin_time() + self.warmup, self.iface.end_time())
         try:
-            tls_ids = self.iface.list_tls_ids()
-
-            # Validate tls if tls not exists
-            for tls_id in adaptive_mask.keys():
-                if tls_id not in tls_ids:
-                    logger.warning("TLS ID %s not found in SUMO.", tls_id)
-
-            # khởi tạo controller
-            for tls_id in tls_ids:
-                ctrl = self._controller_for(tls_id, adaptive_mask)
-                self.controllers[tls_id] = ctrl
-
-                # start controller
-                self.controllers[tls_id].start()
-
-            # Get sample interval PBIL
-            sample_interval  = self.pbil_cfg["sample_interval"]
-
-            t = self.iface.begin_time()
-            end = self.iface.end_time()
-
-            # arr save tls time next action
-            next_action_list = {tls_id: t for tls_id in tls_ids}
-            while t < end:
-
-                # get next time sampling
-                next_sampling = (int(t) // int(sample_interval) + 1) * sample_interval
-
-                # get time next update
-                next_action = min(next_action_list.values())
-
-                # Choose next_sampling or next_action
-                next_time = min(next_sampling, next_action)
-                self.iface.step_to(next_time)
-                t = next_time
-                
-
-                if next_time == next_action:
-                    # get tls_ids next update
-                    next_tls_ids = [tls_id for tls_id, action_time in next_action_list.items() if action_time == next_action]
-
-                    for tls_id in next_tls_ids:
-                        next_update = self.controllers[tls_id].action(t)
-                        next_action_list[tls_id] = next_update
-                
-                if next_time == next_sampling:
-                    self._collect_data(collected_data)
-
-            return collected_data
-        except Exception as e:
-            logger.exception("Error occurred during simulation: %s", e)
+            collected_data = self.simulate({}, end=warmup_end, save_state=state_file)
         finally:
-            self.iface.close()
+            self.iface.shutdown()
+        if collected_data is None:
+            raise RuntimeError("Warm-up simulation failed")
 
-    def run_evaluation(self, adaptive_mask: Dict[str,bool], evaluations: list, output_dir: str) -> dict:
+        collected_data.pop("timings", None)
+        self._warmup_state = state_file
+        self._warmup_data = collected_data
+        self._warmup_end = warmup_end
+        logger.info("Warm-up state saved at t=%.1f -> %s", warmup_end, state_file)
 
-        # Init collected data
-        collected_data = {
-            "total_vehicle": [],
-            "average_occupancy": []
-        }
-
-        self.iface.start_evaluation(evaluations, output_dir)
+    def _controller_for(self, tls_id: str, adaptive_mask: dict):
+        # Spec tính sẵn trong Scenario (adaptive đã có tls_info từ net)
+        name, params = self.scenario.controller_spec(tls_id, bool(adaptive_mask.get(tls_id)))
+        return build_controller(name, tls_id, self.iface, **params)
+
+    def n_samples(self) -> int:
+        """Số mẫu sẽ thu được trong cả horizon [begin, end]."""
+        sample_interval = int(self.pbil_cfg["sample_interval"])
+        return int(self.iface.end_time()) // sample_interval - int(self.iface.begin_time()) // sample_interval
+
+    def simulate(self, adaptive_mask: Dict[str,bool],
+                 outputs: Optional[Dict[str, str]] = None,
+                 load_state: Optional[str] = None,
+                 save_state: Optional[str] = None,
+                 initial_data: Optional[dict] = None,
+                 begin: Optional[float] = None,
+                 end: Optional[float] = None,
+                 collectors: Optional[List[str]] = None,
+                 stop_check: Optional[Callable[[dict], bool]] = None,
+                 options: Optional[List[str]] = None) -> dict:
+        """
+        Vòng mô phỏng dùng chung cho run() và run_evaluation().
+          - outputs: {"summary-output": path, ...} -> start SUMO mới có ghi file output
+          - load_state/begin/initial_data: tiếp tục từ một state đã lưu (warm-start)
+          - save_state: lưu state khi kết thúc (dùng cho warm-up)
+          - collectors: tên metric cần thu (mặc định self.collectors)
+          - stop_check(collected_data): trả về True thì dừng sớm, kết quả có "stopped_at"
+          - options: option SUMO bổ sung (vd. ["--scale", "0.5"] để giảm demand)
+        Kết quả: {metric: np.ndarray float32 [mẫu...], ..., "timings": {pha: giây}};
+        collector per_vehicle thêm "<metric>_values" (một giá trị mỗi xe).
+        """
+        names = self.collectors if collectors is None else collectors
+        initial_data = initial_data or {}
+        collected_data = {name: np.asarray(initial_data.get(name, ()), dtype=np.float32) for name in names}
+
+        timings = {"start": 0.0, "controller_init": 0.0, "step": 0.0,
+                   "actions": 0.0, "collect": 0.0, "close": 0.0}
+        clock = time.perf_counter
+        t_run = clock()
+
+        self.iface.start(outputs=outputs, options=options)
         try:
+            if load_state:
+                self.iface.load_state(load_state)
+            self.iface.reset_subscriptions()
+            metric_collectors = [(name, build_collector(name, self.iface)) for name in names]
+            for _, collector in metric_collectors:
+                collector.setup()
+            self.iface.subscribe_detectors()
             tls_ids = self.iface.list_tls_ids()
+            timings["start"] = clock() - t_run
 
             # Validate tls if tls not exists
             for tls_id in adaptive_mask.keys():
@@ -134,49 +148,114 @@ class SumoSimRunner:
                     logger.warning("TLS ID %s not found in SUMO.", tls_id)
 
             # khởi tạo controller
+            t0 = clock()
             for tls_id in tls_ids:
                 ctrl = self._controller_for(tls_id, adaptive_mask)
                 self.controllers[tls_id] = ctrl
 
                 # start controller
                 self.controllers[tls_id].start()
+            timings["controller_init"] = clock() - t0
 
             # Get sample interval PBIL
             sample_interval  = self.pbil_cfg["sample_interval"]
 
-            t = self.iface.begin_time()
-            end = self.iface.end_time()
-
-            # arr save tls time next action
-            next_action_list = {tls_id: t for tls_id in tls_ids}
-            while t < end:
-
-                # get next time sampling
-                next_sampling = (int(t) // int(sample_interval) + 1) * sample_interval
-
-                # get time next update
-                next_action = min(next_action_list.values())
-
-                # Choose next_sampling or next_action
-                next_time = min(next_sampling, next_action)
+            t = self.iface.begin_time() if begin is None else begin
+            end = self.iface.end_time() if end is None else end
+
+            # Buffer float32 cấp phát sẵn cho cả horizon, collected_data[name] là view buf[:k]
+            n_new = int(end) // int(sample_interval) - int(t) // int(sample_interval) + 1
+            buffers = {}
+            for name in names:
+                buf = np.empty(len(collected_data[name]) + max(n_new, 0), dtype=np.float32)
+                buf[:len(collected_data[name])] = collected_data[name]
+                buffers[name] = buf
+
+            # Hàng đợi sự kiện: chỉ controller cần action() + sự kiện lấy mẫu
+            active, events = self._init_events(tls_ids, t, sample_interval)
+            stopped = False
+            while t < end and not stopped:
+
+                # Nhảy tới sự kiện gần nhất (không vượt quá end)
+                next_time = min(events[0][0], end)
+                t0 = clock()
                 self.iface.step_to(next_time)
+                timings["step"] += clock() - t0
                 t = next_time
-                
 
-                if next_time == next_action:
-                    # get tls_ids next update
-                    next_tls_ids = [tls_id for tls_id, action_time in next_action_list.items() if action_time == next_action]
-
-                    for tls_id in next_tls_ids:
-                        next_update = self.controllers[tls_id].action(t)
-                        next_action_list[tls_id] = next_update
-                
-                if next_time == next_sampling:
-                    self._collect_data(collected_data)
+                for kind, i in self._pop_due(events, next_time):
+                    if kind == _EVENT_ACTION:
+                        t0 = clock()
+                        next_update = self.controllers[active[i]].action(t)
+                        timings["actions"] += clock() - t0
+                        heapq.heappush(events, (next_update, _EVENT_ACTION, i))
+                        continue
+
+                    t0 = clock()
+                    for name, collector in metric_collectors:
+                        k = len(collected_data[name])
+                        buf = buffers[name]
+                        if k == len(buf):
+                            buf = buffers[name] = np.resize(buf, 2 * k + 1)
+                        buf[k] = collector.collect()
+                        collected_data[name] = buf[:k + 1]
+                    timings["collect"] += clock() - t0
+                    heapq.heappush(events, (self._next_sampling(t, sample_interval), _EVENT_SAMPLE, -1))
+
+                    # Racing: dừng mô phỏng chắc chắn thua (mẫu cuối thì chạy xong luôn)
+                    if stop_check is not None and t < end and stop_check(collected_data):
+                        collected_data["stopped_at"] = t
+                        stopped = True
+
+            # Metric theo từng xe (vd. travel time): nối tiếp phần đã thu trong warm-up
+            for name, collector in metric_collectors:
+                values = collector.values()
+                if values is not None:
+                    key = f"{name}_values"
+                    collected_data[key] = np.concatenate([np.asarray(initial_data.get(key, ()), dtype=np.float32), values])
+
+            if save_state:
+                self.iface.save_state(save_state)
 
             return collected_data
         except Exception as e:
             logger.exception("Error occurred during simulation: %s", e)
+            # Session có thể đã hỏng -> đóng hẳn, lần sau start mới
+            self.iface.shutdown()
         finally:
+            t0 = clock()
             self.iface.close()
-
+            timings["close"] = clock() - t0
+            timings["total"] = clock() - t_run
+            collected_data["timings"] = timings
+
+    def run(self, adaptive_mask: Dict[str,bool], stop_check: Optional[Callable[[dict], bool]] = None,
+            end: Optional[float] = None, options: Optional[List[str]] = None) -> dict:
+        """
+        Chạy một cá thể (dùng session SUMO giữ sẵn, warm-start nếu đã prepare_warmup).
+        stop_check(collected_data) được gọi sau mỗi lần thu mẫu; trả về True thì
+        dừng sớm và kết quả có thêm "stopped_at" (thời điểm dừng).
+        end/options: horizon ngắn hơn hoặc option SUMO riêng (đánh giá fidelity thấp).
+        """
+        if end is not None:
+            end = min(end, self.iface.end_time())
+        # State warm-up được lưu với option mặc định -> chỉ dùng lại khi không đổi option
+        if self._warmup_state and not options and (end is None or end > self._warmup_end):
+            # Warm-start: tiếp tục từ state warm-up, giữ nguyên số liệu đã thu
+            return self.simulate(adaptive_mask, load_state=self._warmup_state, begin=self._warmup_end,
+                                 initial_data=self._warmup_data, end=end, stop_check=stop_check)
+        return self.simulate(adaptive_mask, end=end, stop_check=stop_check, options=options)
+
+    def run_evaluation(self, adaptive_mask: Dict[str,bool], evaluations: list, output_dir: str,
+                       options: Optional[List[str]] = None) -> dict:
+        """
+        Chạy đầy đủ từ begin và ghi các file output SUMO (summary-output, queue-output, ...).
+        KPI đọc streaming từ các file đó nằm trong "outputs": {option: {kpi: giá trị}}.
+        """
+        outputs = {item: f"{output_dir}_{item}.xml" for item in evaluations}
+        # Báo cáo đánh giá luôn có các metric mặc định, kể cả khi objective không cần
+        collectors = list(dict.fromkeys(self.DEFAULT_COLLECTORS + self.collectors))
+        res = self.simulate(adaptive_mask, outputs=outputs, collectors=collectors, options=options)
+        if res is not None:
+            res["outputs"] = {option: parsed["kpis"] for option, parsed in parse_outputs(outputs).items()}
+        return res
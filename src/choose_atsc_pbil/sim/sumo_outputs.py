@@ -0,0 +1,196 @@
+# choose_atsc_pbil/sim/sumo_outputs.py
+"""
+Đọc file output XML của SUMO (summary-output, queue-output, detector E2, tripinfo)
+theo kiểu streaming (iterparse): mỗi phần tử được xử lý rồi xoá ngay, bộ nhớ không
+tăng theo kích thước file. Kết quả là các cột NumPy theo khoảng thời gian (hoặc theo
+xe với tripinfo) và các KPI tổng hợp.
+"""
+import logging
+import os
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _Columns:
+    """Cột float32 cấp phát trước, nới gấp đôi khi đầy (như buffer của SumoSimRunner.simulate)."""
+
+    def __init__(self, names, capacity: int = 1024):
+        self.n = 0
+        # Thời gian giữ float64 để horizon dài không mất độ chính xác
+        self.buffers = {name: np.empty(capacity, dtype=np.float64 if name == "time" else np.float32)
+                        for name in names}
+
+    def append(self, values: dict) -> None:
+        for name, buf in self.buffers.items():
+            if self.n == len(buf):
+                buf = self.buffers[name] = np.resize(buf, 2 * self.n)
+            buf[self.n] = values.get(name, np.nan)
+        self.n += 1
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {name: buf[:self.n] for name, buf in self.buffers.items()}
+
+
+def _iter_elements(path: str, tag: str) -> Iterator[ET.Element]:
+    """Các phần tử `tag` (đã đọc xong cả con) của file; xoá khỏi cây sau khi dùng."""
+    with open(path, "rb") as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event == "end" and elem.tag == tag:
+                yield elem
+                root.clear()
+
+
+def _float(elem: ET.Element, name: str) -> float:
+    value = elem.get(name)
+    return float(value) if value not in (None, "") else np.nan
+
+
+def _percentiles(name: str, values: np.ndarray, qs=(50, 95)) -> dict:
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return {}
+    out = {f"{name}_mean": float(values.mean(dtype=np.float64)), f"{name}_max": float(values.max())}
+    for q, v in zip(qs, np.percentile(values, qs)):
+        out[f"{name}_p{q}"] = float(v)
+    return out
+
+
+# --- summary-output: một <step> mỗi bước mô phỏng ---
+_SUMMARY_FIELDS = ("running", "waiting", "halting", "arrived", "teleports", "collisions",
+                   "meanWaitingTime", "meanTravelTime", "meanSpeed")
+
+def parse_summary(path: str) -> dict:
+    cols = _Columns(("time",) + _SUMMARY_FIELDS)
+    for elem in _iter_elements(path, "step"):
+        cols.append({name: _float(elem, name) for name in cols.buffers})
+    series = cols.arrays()
+
+    kpis = {}
+    kpis.update(_percentiles("waiting_time", series["meanWaitingTime"]))
+    kpis.update(_percentiles("halting", series["halting"]))
+    kpis.update(_percentiles("speed", series["meanSpeed"]))
+    if cols.n:
+        # Số tích luỹ: lấy giá trị cuối
+        for name in ("arrived", "teleports", "collisions"):
+            kpis[name] = float(series[name][-1])
+        kpis["mean_travel_time"] = float(series["meanTravelTime"][-1])
+    return {"series": series, "kpis": kpis}
+
+
+# --- queue-output: <data timestep><lanes><lane queueing_length .../></lanes></data> ---
+def parse_queue(path: str) -> dict:
+    cols = _Columns(("time", "n_lanes", "queue_length_total", "queue_length_max", "queueing_time_mean"))
+    for elem in _iter_elements(path, "data"):
+        lengths = [_float(lane, "queueing_length") for lane in elem.iter("lane")]
+        times = [_float(lane, "queueing_time") for lane in elem.iter("lane")]
+        cols.append({
+            "time": _float(elem, "timestep"),
+            "n_lanes": len(lengths),
+            "queue_length_total": sum(lengths),
+            "queue_length_max": max(lengths, default=0.0),
+            "queueing_time_mean": sum(times) / len(times) if times else 0.0,
+        })
+    series = cols.arrays()
+
+    kpis = {}
+    kpis.update(_percentiles("queue_length", series["queue_length_total"]))
+    kpis.update(_percentiles("lane_queue_max", series["queue_length_max"]))
+    kpis.update(_percentiles("queueing_time", series["queueing_time_mean"]))
+    return {"series": series, "kpis": kpis}
+
+
+# --- detector E2 (e2output.xml): một <interval> mỗi detector mỗi khoảng, gộp theo begin ---
+_E2_FIELDS = ("meanOccupancy", "meanMaxJamLengthInMeters", "meanHaltingDuration", "meanSpeed")
+
+def parse_e2(path: str) -> dict:
+    cols = _Columns(("time", "n_detectors") + _E2_FIELDS)
+    begin, acc = None, None
+
+    def flush():
+        n = acc.pop("n_detectors")
+        cols.append(dict({k: v / n for k, v in acc.items()}, time=begin, n_detectors=n))
+
+    # File sắp theo thời gian: gặp begin mới -> ghi khoảng trước
+    for elem in _iter_elements(path, "interval"):
+        t = _float(elem, "begin")
+        if t != begin:
+            if acc:
+                flush()
+            begin, acc = t, dict.fromkeys(_E2_FIELDS, 0.0)
+            acc["n_detectors"] = 0
+        acc["n_detectors"] += 1
+        for name in _E2_FIELDS:
+            value = _float(elem, name)
+            # SUMO ghi -1 khi không có xe (vd. meanSpeed)
+            acc[name] += 0.0 if np.isnan(value) or value < 0 else value
+    if acc:
+        flush()
+    series = cols.arrays()
+
+    kpis = {}
+    kpis.update(_percentiles("occupancy", series["meanOccupancy"]))
+    kpis.update(_percentiles("jam_length", series["meanMaxJamLengthInMeters"]))
+    kpis.update(_percentiles("halting_duration", series["meanHaltingDuration"]))
+    return {"series": series, "kpis": kpis}
+
+
+# --- tripinfo-output: một <tripinfo> mỗi xe đã tới đích ---
+_TRIPINFO_FIELDS = ("depart", "duration", "waitingTime", "timeLoss", "routeLength")
+
+def parse_tripinfo(path: str) -> dict:
+    cols = _Columns(_TRIPINFO_FIELDS)
+    for elem in _iter_elements(path, "tripinfo"):
+        cols.append({name: _float(elem, name) for name in _TRIPINFO_FIELDS})
+    series = cols.arrays()
+
+    kpis = {"n_trips": cols.n}
+    kpis.update(_percentiles("travel_time", series["duration"]))
+    kpis.update(_percentiles("waiting_time", series["waitingTime"]))
+    kpis.update(_percentiles("time_loss", series["timeLoss"]))
+    return {"series": series, "kpis": kpis}
+
+
+# Parser theo tag gốc của file
+PARSERS: Dict[str, Callable[[str], dict]] = {
+    "summary": parse_summary,
+    "queue-export": parse_queue,
+    "detector": parse_e2,
+    "tripinfos": parse_tripinfo,
+}
+
+
+def _root_tag(path: str) -> Optional[str]:
+    # Tự mở file: dừng iterparse giữa chừng không giữ file handle tới khi GC
+    with open(path, "rb") as f:
+        for _, elem in ET.iterparse(f, events=("start",)):
+            return elem.tag
+    return None
+
+
+def parse_output(path: str) -> Optional[dict]:
+    """{"series": {cột: np.ndarray}, "kpis": {tên: float}} hoặc None nếu không có parser."""
+    parser = PARSERS.get(_root_tag(path))
+    return parser(path) if parser else None
+
+
+def parse_outputs(outputs: Dict[str, str]) -> Dict[str, dict]:
+    """Đọc các file output SUMO ({option: path}, như SumoSimRunner.run_evaluation)."""
+    parsed = {}
+    for option, path in outputs.items():
+        if not os.path.exists(path):
+            logger.warning("SUMO output %s not found: %s", option, path)
+            continue
+        try:
+            result = parse_output(path)
+        except ET.ParseError:
+            logger.warning("SUMO output %s is incomplete, skipped: %s", option, path, exc_info=True)
+            continue
+        if result is not None:
+            parsed[option] = result
+    return parsed
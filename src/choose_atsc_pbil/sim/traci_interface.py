@@ -1,7 +1,10 @@
 import os
+import atexit
 from typing import List, Dict, Optional
 from dataclasses import asdict
 
+import numpy as np
+
 
 class TraciIF:
     def __init__(self, sumo_cfg: dict):
@@ -13,21 +16,60 @@ class TraciIF:
         self._end = float(sumo_cfg.get("end", 3600))
         self._step = float(sumo_cfg.get("step_length", 0.1))
 
+        # Giữ SUMO đã nạp giữa các lần chạy (reset bằng traci.load thay vì start lại)
+        self._reuse = bool(sumo_cfg.get("reuse_session", False))
+        self._session_open = False
+
+        # Subscription các biến của edge (bỏ internal edge ":"), đọc 1 lần mỗi thời điểm
+        self._edge_ids = []
+        self._edge_vars = []
+        self._edge_values = {}
+        self._edge_time = None
+
+        # Xe đang trong mạng -> thời điểm xuất phát (để tính travel time khi xe rời mạng).
+        # Khi đang theo dõi, step_to chạy từng bước để không sót xe vào + ra trong cùng một khoảng
+        self._track_arrivals = False
+        self._veh_depart = {}
+        self._arrival_buf = []
+        self._arrived = np.zeros(0)
+        self._arr_time = None
+
+        # Bộ lấy mẫu detector dùng chung cho mọi controller (đọc 1 lần mỗi thời điểm)
+        self._det_index = {}
+        self._det_occ = np.zeros(0)
+        self._det_time = None
+
+        self.traci = self._import_traci()
+
+    def _import_traci(self):
         # Import traci or libsumo
         if self.cfg["runner"] == "libsumo":
             import libsumo as traci
+        elif self.cfg["runner"] == "fake":
+            # Backend giả lập (benchmark/thử nghiệm không có SUMO)
+            from . import fake_traci as traci
+            traci.configure(self.cfg.get("net_info_file"))
         else:
             import traci
+        return traci
+
+    # Module traci/libsumo không pickle được -> import lại ở tiến trình con
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["traci"] = None
+        state["_running"] = False
+        state["_session_open"] = False
+        return state
 
-        self.traci = traci
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.traci = self._import_traci()
 
     def _ensure_import(self):
         if self.traci is None:
             raise ImportError("Could not import traci/sumolib. Ensure SUMO is installed and PYTHONPATH is set.")
 
-    def start(self):
-        self._ensure_import()
-
+    def _sumo_cmd(self) -> List[str]:
         # Determine gui mode
         sumo_gui = "sumo-gui" if self.cfg["gui"] else "sumo"
 
@@ -44,43 +86,84 @@ class TraciIF:
         add = self.cfg.get("add_file")
         if add:
             sumoCmd += ["-a", add]
-        self.traci.start(sumoCmd)
-        self._running = True
 
-    def start_evaluation(self, evaluations, output_dir: str):
-        self._ensure_import()
+        # Warm-start: lưu cả RNG vào state để các lần loadState chạy giống nhau
+        if self.cfg.get("warmup"):
+            sumoCmd += ["--save-state.rng"]
+        return sumoCmd
 
-        # Determine gui mode
-        sumo_gui = "sumo-gui" if self.cfg["gui"] else "sumo"
-
-        # Configure SUMO command
-        sumoCmd = [
-            sumo_gui,
-            "--no-warnings",
-            "--start",  # start simulation immediately
-            "-c", self.cfg["sumocfg"],
-            "--step-length", str(self._step),
-            "--lateral-resolution", str(self.cfg["lateral_resolution"])
-        ]
+    def start(self, outputs: Optional[Dict[str, str]] = None, options: Optional[List[str]] = None):
+        """
+        outputs: {"summary-output": path, ...} -> thêm các option ghi file output của SUMO.
+        options: option SUMO bổ sung cho lần chạy này (vd. ["--scale", "0.5"]).
+        """
+        self._ensure_import()
 
-        for eval_item in evaluations:
-            sumoCmd += [f"--{eval_item}", f"{output_dir}_{eval_item}.xml"]
+        sumoCmd = self._sumo_cmd() + list(options or [])
+
+        # File output chỉ ghi đủ khi SUMO đóng -> luôn start mới, không giữ session
+        if outputs:
+            for option, path in outputs.items():
+                sumoCmd += [f"--{option}", path]
+            self.shutdown()
+            self.traci.start(sumoCmd)
+            self._running = True
+            return
+
+        # Session đã mở sẵn -> nạp lại kịch bản trong cùng kết nối/tiến trình.
+        # Không dùng loadState ở đây: trạng thái toàn cục (routing, junction) của
+        # lần chạy trước bị rò sang lần sau, kết quả không khớp với start mới.
+        if self._reuse and self._session_open:
+            self.traci.load(sumoCmd[1:])
+            self._running = True
+            return
 
-        add = self.cfg.get("add_file")
-        if add:
-            sumoCmd += ["-a", add]
         self.traci.start(sumoCmd)
         self._running = True
 
+        if self._reuse:
+            self._session_open = True
+            atexit.register(self.shutdown)
+
+    def start_evaluation(self, evaluations, output_dir: str):
+        self.start({item: f"{output_dir}_{item}.xml" for item in evaluations})
+
     def close(self):
-        if self._running:
-            self.traci.close()
-            self._running = False
+        if not self._running:
+            return
+        self._running = False
+        # Giữ session cho lần chạy sau
+        if self._session_open:
+            return
+        self.traci.close()
+
+    def shutdown(self):
+        """Đóng hẳn SUMO (kể cả session đang được giữ lại)."""
+        if self._running or self._session_open:
+            try:
+                self.traci.close()
+            except Exception:
+                pass
+        self._running = False
+        self._session_open = False
+
+    def save_state(self, path: str):
+        self.traci.simulation.saveState(path)
+
+    def load_state(self, path: str):
+        self.traci.simulation.loadState(path)
 
     def step(self):
         self.traci.simulationStep()
+        if self._track_arrivals:
+            self._record_arrivals()
 
     def step_to(self, t_abs: float):
+        if self._track_arrivals:
+            # Danh sách departed/arrived chỉ cho bước cuối -> phải đọc sau từng bước
+            while self.traci.simulation.getTime() + self._step / 2 < t_abs:
+                self.step()
+            return
         # SUMO cho phép simulationStep(time) nhảy tới absolute time
         self.traci.simulationStep(t_abs)
 
@@ -104,6 +187,118 @@ class TraciIF:
     def get_list_edge(self):
         return self.traci.edge.getIDList()
 
+    def reset_subscriptions(self) -> None:
+        """Quên các subscription của lần chạy trước (SUMO đã xoá chúng khi start/load)."""
+        self._edge_vars = []
+        self._edge_values = {}
+        self._edge_time = None
+        self._track_arrivals = False
+
+    def subscribe_edges(self, var_names: List[str] = ("LAST_STEP_OCCUPANCY",)) -> int:
+        """
+        Subscribe các biến (tên trong traci.constants) cho mọi edge thường (bỏ internal ":").
+        Gọi nhiều lần thì hợp các biến lại. Phải gọi lại sau mỗi lần start/load
+        vì SUMO xoá subscription khi nạp lại.
+        """
+        for name in var_names:
+            var = getattr(self.traci.constants, name)
+            if var not in self._edge_vars:
+                self._edge_vars.append(var)
+        edge_ids = [e for e in self.traci.edge.getIDList() if not e.startswith(":")]
+        for edge_id in edge_ids:
+            self.traci.edge.subscribe(edge_id, self._edge_vars)
+        self._edge_ids = edge_ids
+        self._edge_values = {var: np.zeros(len(edge_ids), dtype=np.float64) for var in self._edge_vars}
+        self._edge_time = None
+        return len(edge_ids)
+
+    def read_edges(self, var_name: str) -> np.ndarray:
+        """
+        Giá trị một biến trên mọi edge đã subscribe. Kết quả subscription chỉ được
+        đọc ở lần gọi đầu tiên của mỗi thời điểm, các collector sau dùng lại (array không cấp phát mới).
+        """
+        t = self.traci.simulation.getTime()
+        if self._edge_time != t:
+            results = self.traci.edge.getAllSubscriptionResults()
+            for var, arr in self._edge_values.items():
+                if len(results) != len(arr):
+                    arr = self._edge_values[var] = np.zeros(len(results), dtype=np.float64)
+                for i, values in enumerate(results.values()):
+                    arr[i] = values[var]
+            self._edge_time = t
+        return self._edge_values[getattr(self.traci.constants, var_name)]
+
+    def read_edge_occupancy(self) -> np.ndarray:
+        """Occupancy của mọi edge đã subscribe."""
+        return self.read_edges("LAST_STEP_OCCUPANCY")
+
+    def track_arrivals(self) -> None:
+        """
+        Bắt đầu theo dõi xe rời mạng (gọi sau mỗi lần start/load). Từ đó step_to
+        chạy từng bước và đọc simulation.getDepartedIDList/getArrivedIDList sau mỗi
+        bước, nên cả xe vào và ra trong cùng một khoảng lấy mẫu cũng được tính.
+        """
+        self._track_arrivals = True
+        self._veh_depart = {vid: self.traci.vehicle.getDeparture(vid) for vid in self.traci.vehicle.getIDList()}
+        self._arrival_buf = []
+        self._arrived = np.zeros(0)
+        self._arr_time = None
+
+    def _record_arrivals(self) -> None:
+        """Cập nhật xe vào/ra của bước vừa chạy (thời điểm rời lấy bằng thời điểm cuối bước)."""
+        sim = self.traci.simulation
+        t = sim.getTime()
+        arrived = sim.getArrivedIDList()
+        gone = set(arrived)
+        for vid in sim.getDepartedIDList():
+            # Xe vào và ra trong cùng một bước thì không còn để hỏi thời điểm xuất phát
+            self._veh_depart[vid] = t - self._step if vid in gone else self.traci.vehicle.getDeparture(vid)
+        for vid in arrived:
+            depart = self._veh_depart.pop(vid, None)
+            if depart is not None:
+                self._arrival_buf.append(t - depart)
+
+    def read_arrivals(self) -> np.ndarray:
+        """Travel time của các xe đã rời mạng từ lần đọc trước (sai số tối đa một bước mô phỏng)."""
+        t = self.traci.simulation.getTime()
+        if self._arr_time != t:
+            self._arrived = np.array(self._arrival_buf, dtype=np.float64)
+            self._arrival_buf = []
+            self._arr_time = t
+        return self._arrived
+
+    def subscribe_detectors(self) -> int:
+        """
+        Subscribe occupancy (interval gần nhất) cho mọi laneAreaDetector.
+        Phải gọi lại sau mỗi lần start/load vì SUMO xoá subscription khi nạp lại.
+        """
+        var = self.traci.constants.VAR_LAST_INTERVAL_OCCUPANCY
+        det_ids = list(self.traci.lanearea.getIDList())
+        for det_id in det_ids:
+            self.traci.lanearea.subscribe(det_id, [var])
+        self._det_index = {det_id: i for i, det_id in enumerate(det_ids)}
+        self._det_occ = np.zeros(len(det_ids), dtype=np.float64)
+        self._det_time = None
+        return len(det_ids)
+
+    def detector_index(self, detector_ids: List[str]) -> np.ndarray:
+        """Vị trí của các detector trong vector trả về bởi read_detector_occupancy."""
+        return np.array([self._det_index[d] for d in detector_ids], dtype=np.intp)
+
+    def read_detector_occupancy(self, t: float) -> np.ndarray:
+        """
+        Occupancy của mọi detector tại thời điểm t. Chỉ đọc từ SUMO ở lần gọi
+        đầu tiên của mỗi t, các controller sau dùng lại cùng vector.
+        """
+        if self._det_time != t:
+            var = self.traci.constants.VAR_LAST_INTERVAL_OCCUPANCY
+            index = self._det_index
+            occ = self._det_occ
+            for det_id, values in self.traci.lanearea.getAllSubscriptionResults().items():
+                occ[index[det_id]] = values[var]
+            self._det_time = t
+        return self._det_occ
+
     def get_lanearea_occupancy(self, detector_id: str) -> float:
         return self.traci.lanearea.getLastIntervalOccupancy(detector_id)
 
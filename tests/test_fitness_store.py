@@ -0,0 +1,69 @@
+import json
+
+from choose_atsc_pbil.core.fitness_store import FitnessStore, scenario_fingerprint
+
+
+def _scenario(tmp_path, candidates):
+    """Kịch bản tối thiểu: sumocfg + net + candidates_file."""
+    (tmp_path / "net.net.xml").write_text("<net/>", encoding="utf-8")
+    (tmp_path / "s.sumocfg").write_text(
+        '<configuration><input><net-file value="net.net.xml"/></input></configuration>', encoding="utf-8")
+    cand_file = tmp_path / "tls-candidates.json"
+    cand_file.write_text(json.dumps({"candidate_tls_ids": candidates}), encoding="utf-8")
+    return {
+        "sumo": {"sumocfg": str(tmp_path / "s.sumocfg"), "candidates_file": str(cand_file), "end": 100},
+        "controllers": {},
+        "pbil": {"sample_interval": 10.0},
+    }
+
+
+def test_fingerprint_changes_with_candidate_order(tmp_path):
+    cfg = _scenario(tmp_path, {"A": 0.5, "B": 0.5})
+    fp = scenario_fingerprint(cfg)
+    assert scenario_fingerprint(cfg) == fp
+
+    # p khởi tạo không ảnh hưởng score
+    _scenario(tmp_path, {"A": 0.9, "B": 0.1})
+    assert scenario_fingerprint(cfg) == fp
+
+    # Đổi thứ tự / thêm candidate: bit i trỏ tới TLS khác
+    _scenario(tmp_path, {"B": 0.5, "A": 0.5})
+    assert scenario_fingerprint(cfg) != fp
+    _scenario(tmp_path, {"A": 0.5, "B": 0.5, "C": 0.5})
+    assert scenario_fingerprint(cfg) != fp
+
+
+def test_fingerprint_changes_with_scenario_files_and_params(tmp_path):
+    cfg = _scenario(tmp_path, {"A": 0.5})
+    fp = scenario_fingerprint(cfg)
+
+    (tmp_path / "net.net.xml").write_text("<net><edge id='e'/></net>", encoding="utf-8")
+    fp_net = scenario_fingerprint(cfg)
+    assert fp_net != fp
+
+    cfg["sumo"]["end"] = 200
+    assert scenario_fingerprint(cfg) != fp_net
+
+
+def test_store_roundtrip_and_invalidation(tmp_path):
+    path = str(tmp_path / "fitness.sqlite")
+    store = FitnessStore(path, "fp1")
+    assert store.get([1, 0, 1]) is None
+    store.put([1, 0, 1], 12.5, {"total_vehicle": 3.0})
+    assert store.get((1, 0, 1))["score"] == 12.5
+    assert (store.hits, store.misses) == (1, 1)
+    store.close()
+
+    # Nạp lại từ đĩa với cùng fingerprint
+    store = FitnessStore(path, "fp1")
+    assert len(store) == 1
+    rec = store.get([1, 0, 1])
+    assert rec == {"config": [1, 0, 1], "score": 12.5, "res": {"total_vehicle": 3.0}}
+    store.close()
+
+    # Fingerprint khác (vd. candidates đổi thứ tự): không dùng score cũ
+    store = FitnessStore(path, "fp2")
+    assert len(store) == 0
+    assert store.get([1, 0, 1]) is None
+    assert store.key([1, 0, 1]) != FitnessStore(path, "fp1").key([1, 0, 1])
+    store.close()
@@ -0,0 +1,88 @@
+import os
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+
+import pytest
+
+from choose_atsc_pbil.cli import build_net_info
+from choose_atsc_pbil.sim.net_index import DEFAULT_SPEED, load_net_index, parse_net
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NETS = [
+    os.path.join(ROOT, "data", "input", "sumo", "test.net.xml"),
+    os.path.join(ROOT, "data", "input", "sumo", "PhuQuoc_v2", "phuquoc.net.xml"),
+]
+
+
+# --- builder cũ (ET.parse cả cây), giữ làm tham chiếu cho parse_net ---
+def _old_edges(root):
+    edge_attr = {}
+    for edge in root.findall("edge"):
+        edge_id = edge.attrib.get("id")
+        if not edge_id or edge_id.startswith(":"):
+            continue
+        lanes = edge.findall("lane")
+        if lanes:
+            length = float(lanes[0].attrib.get("length", "0.0"))
+            speed = float(lanes[0].attrib.get("speed", str(DEFAULT_SPEED)))
+        else:
+            length, speed = 0.0, DEFAULT_SPEED
+        edge_attr[edge_id] = {"length": length, "speed": speed}
+    return edge_attr
+
+
+def _old_tls(root):
+    tls_conns = defaultdict(list)
+    for conn in root.findall("connection"):
+        tl = conn.attrib.get("tl")
+        if not tl:
+            continue
+        rec = {"link_index": int(conn.attrib.get("linkIndex", "-1")),
+               "from_edge": conn.attrib.get("from"), "to_edge": conn.attrib.get("to")}
+        if "turnRatio" in conn.attrib:
+            rec["turn_ratio"] = float(conn.attrib["turnRatio"])
+        tls_conns[tl].append(rec)
+    for lst in tls_conns.values():
+        lst.sort(key=lambda x: x["link_index"])
+
+    tls_info = {}
+    for tl in root.findall("tlLogic"):
+        phases = [{"index": i, "duration": float(ph.attrib.get("duration", "0")), "state": ph.attrib.get("state", "")}
+                  for i, ph in enumerate(tl.findall("phase"))]
+        tls_info[tl.attrib["id"]] = {"connections": tls_conns.get(tl.attrib["id"], []), "phases": phases,
+                                     "cycle": sum(p["duration"] for p in phases)}
+    return tls_info
+
+
+@pytest.mark.parametrize("net_file", NETS)
+def test_parse_net_matches_old_builder(net_file):
+    root = ET.parse(net_file).getroot()
+    index = parse_net(net_file)
+
+    edges = build_net_info.parse_edges_from_net(index)
+    assert edges == _old_edges(root)
+    assert list(edges) == list(_old_edges(root))
+
+    tls = build_net_info.parse_tl_connections_and_phases(index)
+    assert tls == _old_tls(root)
+    assert list(tls) == list(_old_tls(root))
+
+
+def test_index_cache_roundtrip(tmp_path):
+    net_file = NETS[0]
+    cache_dir = str(tmp_path / "cache")
+    index = load_net_index(net_file, cache_dir=cache_dir)
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+    assert load_net_index(net_file, cache_dir=cache_dir) == index
+    assert load_net_index(net_file, cache_dir=None) == index
+
+
+def test_index_cache_keyed_by_content(tmp_path):
+    net_file = tmp_path / "a.net.xml"
+    net_file.write_text('<net><edge id="e1"><lane id="e1_0" length="10" speed="5"/></edge></net>', encoding="utf-8")
+    cache_dir = str(tmp_path / "cache")
+    assert list(load_net_index(str(net_file), cache_dir=cache_dir)["edges"]) == ["e1"]
+
+    # Sửa file: hash khác -> parse lại, không dùng chỉ mục cũ
+    net_file.write_text('<net><edge id="e2"><lane id="e2_0" length="10" speed="5"/></edge></net>', encoding="utf-8")
+    assert list(load_net_index(str(net_file), cache_dir=cache_dir)["edges"]) == ["e2"]
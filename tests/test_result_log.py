@@ -0,0 +1,67 @@
+import numpy as np
+
+from choose_atsc_pbil.core.result_log import (ResultLog, load_columns, load_timeseries, read_generations,
+                                              read_individuals)
+
+
+def _individual(gen, config, score, **extra):
+    return dict({"gen": gen, "config": config, "score": score, "res": {}, "early_stopped": False}, **extra)
+
+
+def test_roundtrip(tmp_path):
+    log = ResultLog(str(tmp_path))
+    log.write_individual(_individual(0, [1, 0], 2.0))
+    log.write_individual(_individual(0, [0, 1], None, score_low=3.0))
+    log.write_generation({"gen": 0, "best_score": 2.0, "p": [0.5, 0.5]})
+    log.write_timeseries(0, [{"config": [1, 0], "series": {"m": np.arange(3, dtype=np.float32)}},
+                             {"config": [0, 1], "series": {"m": np.arange(2, dtype=np.float32)}}])
+    log.close()
+
+    assert [r["config"] for r in read_individuals(str(tmp_path))] == [[1, 0], [0, 1]]
+    assert list(read_individuals(str(tmp_path), gen=1)) == []
+    assert [g["gen"] for g in read_generations(str(tmp_path))] == [0]
+
+    cols = load_columns(str(tmp_path))
+    assert cols["gen"].tolist() == [0, 0]
+    assert cols["score"][0] == 2.0 and np.isnan(cols["score"][1])
+    assert cols["n_on"].tolist() == [1, 1]
+
+    ts = load_timeseries(str(tmp_path), 0)
+    assert ts["config"].tolist() == [[1, 0], [0, 1]]
+    # Chuỗi ngắn hơn được đệm NaN
+    assert ts["m"].shape == (2, 3) and np.isnan(ts["m"][1, 2])
+
+
+def test_resume_truncates_to_checkpoint(tmp_path):
+    log = ResultLog(str(tmp_path))
+    log.write_individual(_individual(0, [1], 1.0))
+    offsets = log.offsets()
+    # Ghi sau checkpoint (process bị kill trước checkpoint kế tiếp)
+    log.write_individual(_individual(1, [0], 2.0))
+    log.write_generation({"gen": 1})
+    log.close()
+
+    log = ResultLog(str(tmp_path), offsets=offsets)
+    log.write_individual(_individual(1, [1], 3.0))
+    log.close()
+    assert [r["score"] for r in read_individuals(str(tmp_path))] == [1.0, 3.0]
+    assert list(read_generations(str(tmp_path))) == []
+
+
+def test_fresh_run_does_not_mix_with_previous_run(tmp_path):
+    for score in (1.0, 2.0):
+        log = ResultLog(str(tmp_path))
+        log.write_individual(_individual(0, [1], score))
+        log.write_timeseries(0, [{"config": [1], "series": {"m": np.zeros(1, dtype=np.float32)}}])
+        log.close()
+    assert [r["score"] for r in read_individuals(str(tmp_path))] == [2.0]
+    assert load_columns(str(tmp_path))["score"].tolist() == [2.0]
+
+
+def test_partial_last_line_is_ignored(tmp_path):
+    log = ResultLog(str(tmp_path))
+    log.write_individual(_individual(0, [1], 1.0))
+    log.close()
+    with open(tmp_path / "individuals.jsonl", "ab") as f:
+        f.write(b'{"gen": 0, "config": [0')
+    assert len(list(read_individuals(str(tmp_path)))) == 1
@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+
+from choose_atsc_pbil.cli import run_pbil
+from choose_atsc_pbil.core.result_log import read_generations, read_individuals
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _config(tmp_path, name, gmax):
+    """config.json của repo, chạy trên backend giả lập (sumo.runner = "fake")."""
+    with open(os.path.join(ROOT, "configs", "config.json"), "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    for key in ("sumocfg", "net_file", "rou_file", "detectors_file", "net_info_file", "candidates_file"):
+        cfg["sumo"][key] = os.path.join(ROOT, cfg["sumo"][key])
+    cfg["sumo"].update(runner="fake", end=300, warmup=0)
+    cfg["pbil"].update(Gmax=gmax, population=6, random_seed=7, convergence_eps=0.0,
+                       async_eval=False, early_stop=False, surrogate=False, multi_fidelity=False, replications=1)
+    cfg["system"] = {"backend": "local", "max_processes": 2,
+                     "fitness_store": str(tmp_path / f"{name}_fitness.sqlite")}
+    path = tmp_path / f"{name}.json"
+    path.write_text(json.dumps(cfg), encoding="utf-8")
+    return str(path)
+
+
+def _run(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["run-pbil", *args])
+    run_pbil.main()
+
+
+def _summary(run_dir):
+    pbil_dir = os.path.join(run_dir, "pbil")
+    with open(os.path.join(pbil_dir, "checkpoint.json"), "r", encoding="utf-8") as f:
+        ckpt = json.load(f)
+    individuals = [(r["gen"], r["config"], r["score"]) for r in read_individuals(pbil_dir)]
+    generations = [(g["gen"], g["best_config"], g["p"]) for g in read_generations(pbil_dir)]
+    return ckpt["generation"], ckpt["pbil"]["p"], individuals, generations
+
+
+def test_resume_matches_uninterrupted_run(tmp_path, monkeypatch):
+    full_dir = str(tmp_path / "full")
+    _run(monkeypatch, "--config", _config(tmp_path, "full", gmax=4), "--output", full_dir)
+
+    # Lần chạy bị dừng sau 2 thế hệ, sau đó resume tới Gmax = 4
+    part_dir = str(tmp_path / "part")
+    _run(monkeypatch, "--config", _config(tmp_path, "part", gmax=2), "--output", part_dir)
+    assert _summary(part_dir)[0] == 1
+    snapshot = os.path.join(part_dir, "config", "run_config_snapshot.json")
+    with open(snapshot, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    cfg["pbil"]["Gmax"] = 4
+    with open(snapshot, "w", encoding="utf-8") as f:
+        json.dump(cfg, f)
+    _run(monkeypatch, "--resume", part_dir)
+
+    full, resumed = _summary(full_dir), _summary(part_dir)
+    assert resumed[0] == full[0] == 3
+    assert {gen for gen, _, _ in full[2]} == {0, 1, 2, 3}
+    # Cùng cá thể, cùng score, cùng p sau mỗi thế hệ
+    assert resumed == full
@@ -0,0 +1,65 @@
+import json
+import os
+
+import pytest
+
+from choose_atsc_pbil.sim.scenario import Scenario, ScenarioError
+
+NET_INFO = {"tls": {
+    "A": {"controller": "max_pressure", "cycle": 60},
+    "B": {"controller": "webster_like", "cycle": 60},
+}}
+PLAN = {
+    "default": {"name": "fixed_time", "params": {"program_id": "0"}},
+    "max_pressure": {"name": "max_pressure", "params": {"sample_interval": 10.0}},
+}
+
+
+def test_valid_scenario_precomputes_specs():
+    sc = Scenario(NET_INFO, {"A": 0.5}, PLAN)
+    assert sc.controller_spec("A", adaptive=False) == ("fixed_time", {"program_id": "0"})
+    name, params = sc.controller_spec("A", adaptive=True)
+    assert name == "max_pressure"
+    assert params["tls_info"] is NET_INFO["tls"]["A"]
+    # TLS có controller ngoài plan: chỉ lỗi khi thực sự bật adaptive
+    assert "B" not in sc.adaptive_specs
+    with pytest.raises(ScenarioError):
+        sc.controller_spec("B", adaptive=True)
+
+
+def test_unknown_candidate():
+    with pytest.raises(ScenarioError, match="candidate TLS 'X' not found"):
+        Scenario(NET_INFO, {"A": 0.5, "X": 0.5}, PLAN)
+
+
+def test_candidate_controller_not_in_plan():
+    with pytest.raises(ScenarioError, match="controller 'webster_like' not in controller plan"):
+        Scenario(NET_INFO, {"B": 0.5}, PLAN)
+
+
+def test_unknown_controller_and_missing_default_reported_together():
+    plan = {"max_pressure": {"name": "no_such_controller"}}
+    with pytest.raises(ScenarioError) as exc:
+        Scenario(NET_INFO, {"A": 0.5}, plan)
+    msg = str(exc.value)
+    assert 'no "default" entry' in msg
+    assert "unknown controller 'no_such_controller'" in msg
+
+
+def test_load_caches_and_reloads_on_change(tmp_path):
+    net_info_file = tmp_path / "net-info.json"
+    cand_file = tmp_path / "tls-candidates.json"
+    net_info_file.write_text(json.dumps(NET_INFO), encoding="utf-8")
+    cand_file.write_text(json.dumps({"candidate_tls_ids": {"A": 0.5}}), encoding="utf-8")
+    cfg = {"sumo": {"net_info_file": str(net_info_file), "candidates_file": str(cand_file)}, "controllers": PLAN}
+
+    sc = Scenario.load(cfg)
+    assert Scenario.load(cfg) is sc
+    assert list(sc.candidates) == ["A"]
+
+    # File candidates sửa thành TLS không có trong net_info -> lỗi ngay khi nạp
+    cand_file.write_text(json.dumps({"candidate_tls_ids": {"Z": 0.5}}), encoding="utf-8")
+    st = os.stat(cand_file)
+    os.utime(cand_file, (st.st_atime, st.st_mtime + 10))
+    with pytest.raises(ScenarioError):
+        Scenario.load(cfg)